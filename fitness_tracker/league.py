@@ -0,0 +1,194 @@
+"""
+League-wide statistics across every <username>.txt file in a folder.
+
+Each user file is parsed and summarised in a worker process, then the
+per-user summaries are merged into leaderboards per exercise and month.
+
+Usage:
+    python league.py [directory] [--metric total_distance] [--top 10]
+"""
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from main import User
+from summary import Summary
+
+METRICS = (
+    "total_distance",
+    "average_distance",
+    "total_duration",
+    "average_speed",
+    "max_distance",
+)
+
+
+def month_sort_key(month):
+    """
+    Orders "MM/YYYY" strings chronologically, with "all" last.
+    """
+    if month == "all":
+        return (10000, 0)
+    try:
+        month_number, year = month.split("/")
+        return (int(year), int(month_number))
+    except ValueError:
+        # Malformed dates in hand-edited files sort first
+        return (0, 0)
+
+
+def summarise_user(directory, username):
+    """
+    Reads one user's file and groups their workouts.
+    Input:
+        directory (str): Folder holding the user's file.
+        username (str): The user to summarise.
+    Returns:
+        (username, groups): groups maps (exercise, month) to
+        [count, total distance, total duration, max distance],
+        with month "all" holding the all-time figures.
+    """
+    user = User(username, directory)
+    if user.read_data() == False:
+        return username, {}
+
+    # Grouped the same way as the summary sidecar, without writing one
+    summary = Summary()
+    for exercise in user.exercises:
+        summary.add(exercise.name, exercise.distance, exercise.duration, exercise.date)
+
+    # The league does not rank by max speed, so leave it out
+    groups = {key: group[:4] for key, group in summary.groups.items()}
+    return username, groups
+
+
+def _summarise_batch(directory, usernames):
+    return [summarise_user(directory, username) for username in usernames]
+
+
+def calculate_metrics(group):
+    """
+    Converts a raw group into the metrics shown by track_fitness.
+    Input:
+        group (list): [count, total distance, total duration, max distance]
+    Returns:
+        metrics (dict): Rounded metrics for the group.
+    """
+    count, distance, duration, max_distance = group
+    total_distance = round(distance, 1)
+
+    if duration == 0:
+        average_speed = 0.0
+    else:
+        # Converting from km per mins to km per hour
+        average_speed = round((total_distance / duration) * 60, 2)
+
+    return {
+        "count": count,
+        "total_distance": total_distance,
+        "average_distance": round(total_distance / count, 1),
+        "total_duration": duration,
+        "average_duration": int(round(duration / count, 0)),
+        "average_speed": average_speed,
+        "max_distance": max_distance,
+    }
+
+
+def find_users(directory):
+    """
+    Returns:
+        usernames (list): Users with a <username>.txt file in directory.
+    """
+    paths = glob.glob(os.path.join(directory, "*.txt"))
+    return sorted(os.path.basename(path)[:-4] for path in paths)
+
+
+def collect_league(directory=".", workers=None, batch_size=64):
+    """
+    Parses every user file in parallel.
+    Input:
+        directory (str): Folder to scan for user files.
+        workers (int): Number of worker processes, defaults to CPU count.
+        batch_size (int): Users handed to a worker at a time.
+    Returns:
+        league (dict): Maps (exercise, month) to {username: metrics}.
+    """
+    usernames = find_users(directory)
+    batches = [
+        usernames[start:start + batch_size]
+        for start in range(0, len(usernames), batch_size)
+    ]
+
+    league = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_summarise_batch, [directory] * len(batches), batches)
+        for batch in results:
+            for username, groups in batch:
+                for key, group in groups.items():
+                    league.setdefault(key, {})[username] = calculate_metrics(group)
+
+    return league
+
+
+def leaderboards(league, metric="total_distance", top=10):
+    """
+    Ranks users for every exercise and month.
+    Input:
+        league (dict): Output of collect_league.
+        metric (str): One of METRICS to rank by.
+        top (int): Number of users to keep per board.
+    Returns:
+        boards (list): [(exercise, month, [(username, value), ...]), ...]
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported metric: {metric}")
+
+    boards = []
+    keys = sorted(league, key=lambda key: (key[0], month_sort_key(key[1])))
+    for exercise, month in keys:
+        users = league[(exercise, month)]
+        ranking = sorted(
+            ((username, metrics[metric]) for username, metrics in users.items()),
+            key=lambda item: (-item[1], item[0]),
+        )
+        boards.append((exercise, month, ranking[:top]))
+
+    return boards
+
+
+def print_leaderboards(boards, metric):
+    line = 27 * "~"
+    for exercise, month, ranking in boards:
+        print(line)
+        print(f"{exercise} {month} by {metric}")
+        print(line)
+        for position, (username, value) in enumerate(ranking, 1):
+            print(f"{position:>3}. {username:<20} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="League-wide fitness leaderboards")
+    parser.add_argument("directory", nargs="?", default=".")
+    parser.add_argument("--metric", default="total_distance", choices=METRICS)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print boards as JSON")
+    args = parser.parse_args()
+
+    league = collect_league(args.directory, args.workers)
+    boards = leaderboards(league, args.metric, args.top)
+
+    if args.json:
+        output = [
+            {"exercise": exercise, "month": month, "ranking": ranking}
+            for exercise, month, ranking in boards
+        ]
+        print(json.dumps(output, indent=2))
+    else:
+        print_leaderboards(boards, args.metric)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,10 @@
+import os
+
+from storage import append_records, parse_record, read_records
+from summary import load_summary, update_summary
+from timeseries import MonthIndex, month_key, parse_month_range
+
+
 class Exercise:
     def __init__(self, name, distance, duration, date):
         self.name = name
@@ -19,8 +26,10 @@ class Exercise:
 
 
 class User:
-    def __init__(self, username):
+    def __init__(self, username, directory=""):
         self.username = username
+        # folder holding <username>.txt, defaults to the current one
+        self.directory = directory
         # intialise empty list of exercises to add to 
         # later from file data
         self.exercises = []
@@ -32,22 +41,21 @@ class User:
         return self.exercises
 
     def read_data(self):
-        filename = self.username + ".txt"
+        filename = os.path.join(self.directory, self.username + ".txt")
 
         try:
-            file_object = open(filename, "r")
+            # Complete lines only, read under a shared lock
+            lines = read_records(filename)
         except FileNotFoundError:
             print(f"{self.username} has no available data.")
             return False
 
-        for line in file_object.readlines():
-            # Remove any extra whitespaces in line
-            stripped = line.strip()
-            # Split data in line to assign to fields later
-            fields = stripped.split(",")
+        for line in lines:
+            # Split the line into fields, as the summary file does
+            fields = parse_record(line)
 
-            # Skip invalid or blank lines
-            if len(fields) != 4:
+            # Skip invalid or blank lines, including malformed numbers
+            if fields == None:
                 continue
             else:
                 # Create an Exercise object from fields and
@@ -56,7 +64,6 @@ class User:
                 item = Exercise(name, distance, duration, date)
                 self.exercises.append(item)
 
-        file_object.close()
         return True
 
     def calculate_distance(self, exercise_name, month):
@@ -105,6 +112,17 @@ class User:
 
         return max_duration
 
+    def calculate_max_speed(self, exercise_name):
+        max_speed = 0
+        # Find the greatest speed in km/h in the exercises list
+        for exercise in self.exercises:
+            if exercise.name == exercise_name:
+                speed = (exercise.distance / exercise.duration) * 60
+                if speed > max_speed:
+                    max_speed = speed
+
+        return max_speed
+
     def count_matching_data(self, exercise_name, month):
         count = 0
         # Count occurence of given exercise name
@@ -245,12 +263,61 @@ def log_workout(username: str):
     distance = str(extract_distance(distance_with_unit))
 
     filename = username + ".txt"  # Find file name from username
-    user_data = f"""{exercise},{distance},{duration},{date}
-"""
-    # Append information to file
-    f = open(filename, "a")
-    f.write(user_data)
-    f.close()
+    user_data = format_workout(exercise, distance, duration, date)
+
+    # Append information to file under an exclusive lock
+    append_records(filename, user_data)
+
+    # Fold the new line into the user's summary file
+    update_summary(username)
+
+
+'''This function formats one workout as a line of the user's file.'''
+def format_workout(exercise, distance, duration, date):
+    return f"{exercise},{distance},{duration},{date}\n"
+
+
+'''This function logs many workouts in one buffered append.
+Each workout is an (exercise, distance with unit, duration, date)
+tuple checked with the same rules as log_workout. Invalid workouts
+are skipped and returned so the caller can report them. With fsync
+set, the data is flushed to disk before returning.'''
+def log_workouts(username: str, workouts, fsync=False):
+    lines = []
+    rejected = []
+
+    for workout in workouts:
+        exercise_type, distance_with_unit, duration, date = workout
+        exercise = exercise_type.lower()
+
+        # Reject invalid exercise names
+        if (exercise != "swim") and (exercise != "run") and (exercise != "cycle"):
+            rejected.append(workout)
+            continue
+
+        # Malformed dates, distances and durations raise while parsing
+        try:
+            if is_valid_date(date) == False:
+                rejected.append(workout)
+                continue
+            distance = str(extract_distance(distance_with_unit))
+            int(duration)
+        except (ValueError, IndexError):
+            rejected.append(workout)
+            continue
+
+        lines.append(format_workout(exercise, distance, duration, date))
+
+    if lines == []:
+        return rejected
+
+    filename = username + ".txt"  # Find file name from username
+
+    # Append every valid workout with a single locked write
+    append_records(filename, "".join(lines), fsync)
+
+    update_summary(username)
+    return rejected
 
 
 '''This function extracts numerical part of distance input
@@ -274,10 +341,12 @@ def extract_distance(distance_with_unit: str):
 '''This function tracks the user's fitness and displays
 a summary of their data.'''
 def track_fitness(username):
-    user = User(username)
+    # The summary file answers queries without re-reading the log
+    summary = load_summary(username)
 
     # Check if data exists
-    if user.read_data() == False:
+    if summary == None:
+        print(f"{username} has no available data.")
         return
     else:
         # Reject invalid exercise names
@@ -287,126 +356,140 @@ def track_fitness(username):
             return
 
         month = input("What month would you like to track (mm/yyyy)? ")
+        month_range = parse_month_range(month)
         # If user requests all timeframes in given exercise
         if month == "all":
             month = None
+            source = summary
+        # A range such as "03/2023 to 11/2024" is answered from the month index
+        elif month_range != None:
+            start, end = month_range
+            if is_valid_date(start) == False or is_valid_date(end) == False:
+                return
+            month = None
+            source = MonthIndex.from_summary(summary).view(month_key(start), month_key(end))
+            if source.count_matching_data(exercise, None) == 0:
+                print(f"{username} has no {exercise} data from {start} to {end}.")
+                return
         # Checking validity of month
         elif is_valid_date(month) == False:
             return
+        else:
+            source = summary
 
-        # Count number of matching exercises by name and month
-        # for average distance and duration calculation
-        count = user.count_matching_data(exercise, month)
-
-        total_distance = round(user.calculate_distance(exercise, month), 1)
-        average_distance = round(total_distance / count, 1)
-        total_duration = round(user.calculate_duration(exercise, month), 1)
-        average_duration = int(round(total_duration / count, 0))
-        # Converting from km per mins to km per hour
-        average_speed = round((total_distance / total_duration) * 60, 2)
-        average_speed_2dp = "{:.2f}".format(average_speed)
-
-        print(f"Total distance: {total_distance}km")
-        print(f"Average distance: {average_distance}km")
-        print(f"Total duration: {total_duration} mins")
-        print(f"Average duration: {average_duration} mins")
+        stats = calculate_fitness(source, exercise, month)
+        average_speed_2dp = "{:.2f}".format(stats["average_speed"])
+
+        print(f"Total distance: {stats['total_distance']}km")
+        print(f"Average distance: {stats['average_distance']}km")
+        print(f"Total duration: {stats['total_duration']} mins")
+        print(f"Average duration: {stats['average_duration']} mins")
         print(f"Average speed (km/h): {average_speed_2dp}km/h")
 
     return
 
 
+'''This function calculates the summary displayed by track_fitness
+for an exercise and month (None for all months), so that other
+front ends can reuse the same figures. It accepts a User or a
+Summary loaded from the user's summary file.'''
+def calculate_fitness(user, exercise, month):
+    # Count number of matching exercises by name and month
+    # for average distance and duration calculation
+    count = user.count_matching_data(exercise, month)
+
+    total_distance = round(user.calculate_distance(exercise, month), 1)
+    average_distance = round(total_distance / count, 1)
+    total_duration = round(user.calculate_duration(exercise, month), 1)
+    average_duration = int(round(total_duration / count, 0))
+    # Converting from km per mins to km per hour
+    average_speed = round((total_distance / total_duration) * 60, 2)
+
+    return {
+        "count": count,
+        "total_distance": total_distance,
+        "average_distance": average_distance,
+        "total_duration": total_duration,
+        "average_duration": average_duration,
+        "average_speed": average_speed,
+    }
+
+
 def health_plan(username):
-    user = User(username)
-    if user.read_data() == False:
+    summary = load_summary(username)
+    if summary == None:
+        print(f"{username} has no available data.")
         return
 
     else:
         goal_input = input("What goal would you like to achieve? ")
         goal = goal_input.lower()
 
-        if (
-            (goal != "marathon run")
-            and (goal != "marathon swim")
-            and (goal != "century")
-            and (goal != "ironman")
-            and (goal != "5 minute mile")
-        ):
+        if (goal not in GOAL_DISTANCES) and (goal not in GOAL_SPEEDS):
             print(f"Sorry, that goal is not supported.")
             return
 
         else:
             weeks = float(input("How many weeks do you have to achieve it? "))
 
-        if goal == "marathon run":
-            exercise_type = "run"
-            goal_distance = 42
-            print(f"To achieve the {goal_input} challenge you need to:")
-            calculate_recommendation(
-                user, exercise_type, goal_distance, goal_input, weeks
-            )
-
-        elif goal == "marathon swim":
-            exercise_type = "swim"
-            goal_distance = 10
-            print(f"To achieve the {goal_input} challenge you need to:")
-            calculate_recommendation(
-                user, exercise_type, goal_distance, goal_input, weeks
-            )
-
-        elif goal == "century":
-            exercise_type = "cycle"
-            goal_distance = 100
-            print(f"To achieve the {goal_input} challenge you need to:")
-            calculate_recommendation(
-                user, exercise_type, goal_distance, goal_input, weeks
-            )
-
-        elif goal == "ironman":
-            # Each exercise in ironman has an associated distance value
-            exercise_type = {"swim": 4, "cycle": 180, "run": 42}
-            print(f"To achieve the {goal_input} challenge you need to:")
-            for exercise in exercise_type:
-                goal_distance = exercise_type[exercise]
-                calculate_recommendation(
-                    user, exercise, goal_distance, goal_input, weeks
-                )
-
-        elif goal == "5 minute mile":
-            exercise_type = "run"
-            goal_speed_km = 12 * 1.6
-            max_speed = 0
-
-            print(f"To achieve the {goal_input} challenge you need to:")
-
-            for exercise in user.exercises:
-                if exercise.name == exercise_type:
-                    # Convert speed from miles per hour to kilometres per hour
-                    speed_kilometres_hour = (exercise.distance / exercise.duration) * 60
-                    # Determine maximum speed from exercises list of run type
-                    if speed_kilometres_hour > max_speed:
-                        max_speed = speed_kilometres_hour
-
-            total_speed_needed = goal_speed_km - float(max_speed)
-
-            if total_speed_needed <= 0:
-                speed_per_week = 0.0
+        print(f"To achieve the {goal_input} challenge you need to:")
+        for recommendation in calculate_goal(summary, goal, weeks):
+            exercise = recommendation["exercise"]
+            per_week = recommendation["per_week"]
+            if recommendation["measure"] == "speed":
+                print(f"    Increase your max speed by {per_week}km/h per week.")
             else:
-                speed_per_week = round(total_speed_needed / weeks, 2)
-
-            print(f"    Increase your max speed by {speed_per_week}km/h per week.")
-
-
-"""This function calculates the additional distance needed to reach goal."""
-def calculate_recommendation(user, exercise_type, goal_distance, goal_input, weeks):
-    maximum_distance = user.calculate_max_distance(exercise_type)
-
-    total_distance_needed = goal_distance - float(maximum_distance)
-    if total_distance_needed <= 0:
-        distance_per_week = 0.0
-    else:
-        distance_per_week = round(total_distance_needed / weeks, 1)
-        
-    print(f"    Increase your max {exercise_type} by {distance_per_week}km per week.")
+                print(f"    Increase your max {exercise} by {per_week}km per week.")
+
+
+# Distance goals map each exercise they need to a distance in km
+GOAL_DISTANCES = {
+    "marathon run": {"run": 42},
+    "marathon swim": {"swim": 10},
+    "century": {"cycle": 100},
+    "ironman": {"swim": 4, "cycle": 180, "run": 42},
+}
+# Speed goals map an exercise to a speed in km/h; a 5 minute mile
+# is 12 miles per hour converted to kilometres per hour
+GOAL_SPEEDS = {
+    "5 minute mile": {"run": 12 * 1.6},
+}
+
+
+'''This function calculates the recommendations health_plan displays
+for a goal, so that other front ends can reuse them. Each is a dict
+with the exercise, the measure ("distance" in km or "speed" in km/h)
+and the increase needed per week. It accepts a User or a Summary.'''
+def calculate_goal(user, goal, weeks):
+    recommendations = []
+
+    for exercise, goal_distance in GOAL_DISTANCES.get(goal, {}).items():
+        maximum_distance = user.calculate_max_distance(exercise)
+        recommendations.append({
+            "exercise": exercise,
+            "measure": "distance",
+            "per_week": weekly_increase(goal_distance, maximum_distance, weeks, 1),
+        })
+
+    for exercise, goal_speed in GOAL_SPEEDS.get(goal, {}).items():
+        # Determine maximum speed from exercises list of this type
+        max_speed = user.calculate_max_speed(exercise)
+        recommendations.append({
+            "exercise": exercise,
+            "measure": "speed",
+            "per_week": weekly_increase(goal_speed, max_speed, weeks, 2),
+        })
+
+    return recommendations
+
+
+"""This function calculates the weekly increase needed to take
+a best effort up to a goal, rounded to the given decimal places."""
+def weekly_increase(goal, best, weeks, digits):
+    total_needed = goal - float(best)
+    if total_needed <= 0:
+        return 0.0
+    return round(total_needed / weeks, digits)
 
 
 def main():
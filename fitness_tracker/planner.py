@@ -0,0 +1,166 @@
+"""
+Goal planning for every goal, horizon and user in one pass.
+
+health_plan answers one goal at a time, and each goal rescans the data
+for a maximum. Here each user's best distance and speed per exercise
+are looked up once, from the summary file, and every supported goal
+is evaluated against them for a list of week horizons. The results are
+the same figures health_plan prints. Batches of users are planned in
+worker processes.
+
+Usage:
+    python planner.py [directory] [--weeks 4 8 12] [--goal century] [--users alice bob]
+"""
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from league import find_users
+from main import GOAL_DISTANCES, GOAL_SPEEDS, calculate_goal
+from summary import load_summary
+
+GOALS = tuple(GOAL_DISTANCES) + tuple(GOAL_SPEEDS)
+DEFAULT_WEEKS = (4, 8, 12, 16)
+
+
+class Bests:
+    def __init__(self, max_distances, max_speeds):
+        """
+        Initializes a user's best efforts.
+        Input:
+            max_distances (dict): Maps exercise to max distance in km.
+            max_speeds (dict): Maps exercise to max speed in km/h.
+        """
+        self.max_distances = max_distances
+        self.max_speeds = max_speeds
+
+    # The methods below mirror User so that calculate_goal
+    # accepts the precomputed bests in place of a User.
+
+    def calculate_max_distance(self, exercise_name):
+        return self.max_distances.get(exercise_name, 0)
+
+    def calculate_max_speed(self, exercise_name):
+        return self.max_speeds.get(exercise_name, 0)
+
+
+def bests_from_summary(summary):
+    """
+    Returns:
+        bests (Bests): Max distance and speed per exercise, read from
+        the summary's all-time groups.
+    """
+    max_distances = {}
+    max_speeds = {}
+    for (name, month), group in summary.groups.items():
+        if month == "all":
+            max_distances[name] = group[3]
+            max_speeds[name] = group[4]
+    return Bests(max_distances, max_speeds)
+
+
+def evaluate_goals(bests, weeks_list=DEFAULT_WEEKS, goals=GOALS):
+    """
+    Evaluates goals for every week horizon.
+    Input:
+        bests (Bests): A user's best efforts.
+        weeks_list (iterable): Week horizons to plan for.
+        goals (iterable): Goals to evaluate.
+    Returns:
+        plans (dict): Maps goal to {weeks: recommendations}, each as
+        returned by calculate_goal.
+    """
+    plans = {}
+    for goal in goals:
+        plans[goal] = {weeks: calculate_goal(bests, goal, weeks) for weeks in weeks_list}
+    return plans
+
+
+def plan_user(username, directory="", weeks_list=DEFAULT_WEEKS, goals=GOALS):
+    """
+    Returns:
+        plan (dict or None): The user and their plans, or None if
+        the user has no data.
+    """
+    summary = load_summary(username, directory)
+    if summary is None:
+        return None
+    return {"user": username, "plans": evaluate_goals(bests_from_summary(summary), weeks_list, goals)}
+
+
+def _plan_batch(directory, usernames, weeks_list, goals):
+    # Worker entry point: one process plans a batch of users
+    plans = []
+    for username in usernames:
+        plan = plan_user(username, directory, weeks_list, goals)
+        if plan is not None:
+            plans.append(plan)
+    return plans
+
+
+def plan_users(directory=".", usernames=None, weeks_list=DEFAULT_WEEKS, goals=GOALS,
+               workers=None, batch_size=64):
+    """
+    Plans every user in a folder.
+    Input:
+        directory (str): Folder holding the user files.
+        usernames (list): Users to plan, defaults to every user file.
+        weeks_list (iterable): Week horizons to plan for.
+        goals (iterable): Goals to evaluate.
+        workers (int): Number of worker processes, defaults to CPU count;
+        1 plans in this process.
+        batch_size (int): Users handed to a worker at a time.
+    Yields:
+        plan (dict): Each user's plans, in username order.
+    Raises:
+        ValueError: If a week horizon is not greater than 0, before
+        any user is planned.
+    """
+    weeks_list = tuple(weeks_list)
+    if any(weeks <= 0 for weeks in weeks_list):
+        raise ValueError("Weeks must be greater than 0.")
+    if usernames is None:
+        usernames = find_users(directory)
+    goals = tuple(goals)
+    batches = [
+        usernames[start:start + batch_size]
+        for start in range(0, len(usernames), batch_size)
+    ]
+
+    if workers == 1 or len(batches) <= 1:
+        for batch in batches:
+            yield from _plan_batch(directory, batch, weeks_list, goals)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _plan_batch,
+            [directory] * len(batches),
+            batches,
+            [weeks_list] * len(batches),
+            [goals] * len(batches),
+        )
+        for plans in results:
+            yield from plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan every goal for every user")
+    parser.add_argument("directory", nargs="?", default=".")
+    # Whole weeks, like DEFAULT_WEEKS, so the JSON keys read "4" either way
+    parser.add_argument("--weeks", type=int, nargs="+", default=list(DEFAULT_WEEKS))
+    parser.add_argument("--goal", action="append", choices=GOALS, help="goal to plan, repeatable")
+    parser.add_argument("--users", nargs="+", help="users to plan, defaults to all")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if any(weeks <= 0 for weeks in args.weeks):
+        parser.error("Weeks must be greater than 0.")
+
+    goals = args.goal or GOALS
+    for plan in plan_users(args.directory, args.users, args.weeks, goals, args.workers):
+        # One JSON object per line, so large batches can be streamed
+        print(json.dumps(plan))
+
+
+if __name__ == "__main__":
+    main()
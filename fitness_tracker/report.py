@@ -0,0 +1,167 @@
+"""
+Non-interactive command line for scripted fitness reports.
+
+Runs one action for one user and prints the result as a line of JSON,
+with no welcome screen or login prompts.
+
+Usage:
+    python report.py USER track --exercise run [--month 03/2023]
+    python report.py USER track --exercise run --month "03/2023 to 11/2024"
+    python report.py USER plan --goal "marathon run" --weeks 12
+    python report.py USER log --exercise run --distance "5 km" --duration 30 --date 03/2023
+
+Exits with status 1 and an {"error": ...} object when the request is
+invalid or the user has no data.
+"""
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+
+from main import GOAL_DISTANCES, GOAL_SPEEDS, calculate_fitness, calculate_goal, is_valid_date, log_workouts
+from summary import load_summary
+from timeseries import MonthIndex, month_key, parse_month_range
+
+EXERCISES = ("swim", "run", "cycle")
+
+
+def check_date(date):
+    """
+    Raises ValueError unless date is a valid MM/YYYY.
+    """
+    # is_valid_date explains problems with print(), so keep them off the JSON
+    with redirect_stdout(sys.stderr):
+        try:
+            valid = is_valid_date(date)
+        except (ValueError, IndexError):
+            valid = False
+    if not valid:
+        raise ValueError(f"Invalid date: {date}")
+
+
+def check_exercise(exercise):
+    if exercise not in EXERCISES:
+        raise ValueError(f"Sorry, {exercise} is not supported.")
+
+
+def load_user_summary(username):
+    summary = load_summary(username)
+    if summary is None:
+        raise ValueError(f"{username} has no available data.")
+    return summary
+
+
+def track(username, exercise, month="all"):
+    """
+    Returns the figures track_fitness displays.
+    Input:
+        username (str): The user to report on.
+        exercise (str): swim, run or cycle.
+        month (str): MM/YYYY, a range "MM/YYYY to MM/YYYY", or "all".
+    Returns:
+        report (dict): The calculate_fitness figures for the request.
+    """
+    check_exercise(exercise)
+    summary = load_user_summary(username)
+
+    if month == "all":
+        source = summary
+        query_month = None
+    elif " to " in month:
+        start, end = parse_month_range(month)
+        check_date(start)
+        check_date(end)
+        source = MonthIndex.from_summary(summary).view(month_key(start), month_key(end))
+        query_month = None
+    else:
+        check_date(month)
+        source = summary
+        query_month = month
+
+    if source.count_matching_data(exercise, query_month) == 0:
+        raise ValueError(f"{username} has no {exercise} data for {month}.")
+
+    report = {"user": username, "exercise": exercise, "month": month}
+    report.update(calculate_fitness(source, exercise, query_month))
+    return report
+
+
+def plan(username, goal, weeks):
+    """
+    Returns the recommendations health_plan displays.
+    Input:
+        username (str): The user to plan for.
+        goal (str): A goal supported by health_plan.
+        weeks (float): Weeks until the goal.
+    Returns:
+        report (dict): The goal and its calculate_goal recommendations.
+    """
+    goal = goal.lower()
+    if goal not in GOAL_DISTANCES and goal not in GOAL_SPEEDS:
+        raise ValueError("Sorry, that goal is not supported.")
+    if weeks <= 0:
+        raise ValueError("Weeks must be greater than 0.")
+
+    summary = load_user_summary(username)
+    return {
+        "user": username,
+        "goal": goal,
+        "weeks": weeks,
+        "recommendations": calculate_goal(summary, goal, weeks),
+    }
+
+
+def log(username, exercise, distance, duration, date):
+    """
+    Logs one workout, validated the same way as log_workout.
+    Returns:
+        report (dict): The user and the number of workouts logged.
+    """
+    # Validation messages go to stderr so stdout stays JSON
+    with redirect_stdout(sys.stderr):
+        rejected = log_workouts(username, [(exercise, distance, duration, date)])
+    if rejected:
+        raise ValueError("Invalid workout")
+    return {"user": username, "logged": 1}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scripted fitness tracker reports")
+    parser.add_argument("user")
+    parser.add_argument("action", choices=("track", "plan", "log"))
+    parser.add_argument("--exercise")
+    parser.add_argument("--month", default="all", help='MM/YYYY, "MM/YYYY to MM/YYYY" or all')
+    parser.add_argument("--goal")
+    parser.add_argument("--weeks", type=float)
+    parser.add_argument("--distance", help='e.g. "5 km" or "3 miles"')
+    parser.add_argument("--duration", help="minutes")
+    parser.add_argument("--date", help="MM/YYYY")
+    args = parser.parse_args(argv)
+
+    # Only the arguments the chosen action uses are required
+    required = {
+        "track": ("exercise",),
+        "plan": ("goal", "weeks"),
+        "log": ("exercise", "distance", "duration", "date"),
+    }
+    missing = [name for name in required[args.action] if getattr(args, name) is None]
+    if missing:
+        parser.error(f"{args.action} needs --" + ", --".join(missing))
+
+    try:
+        if args.action == "track":
+            result = track(args.user, args.exercise, args.month)
+        elif args.action == "plan":
+            result = plan(args.user, args.goal, args.weeks)
+        else:
+            result = log(args.user, args.exercise, args.distance, args.duration, args.date)
+    except ValueError as error:
+        print(json.dumps({"user": args.user, "action": args.action, "error": str(error)}))
+        return 1
+
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+Long-running analytics service for the fitness tracker.
+
+Keeps recently used User objects in a memory-bounded LRU cache so
+repeated queries do not re-parse <username>.txt from disk. A cached
+user is dropped as soon as its file's mtime or size changes.
+
+Run the server:
+    python service.py --port 8080 --cache-mb 64
+Query it with the bundled client:
+    python service.py --client alice run all
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+from main import User, calculate_fitness
+from timeseries import month_key, month_label
+
+SUPPORTED_EXERCISES = ("swim", "run", "cycle")
+
+
+def is_valid_username(username):
+    """
+    Returns:
+        bool: True if username names a file in the data folder, with
+        no path separators or parent references.
+    """
+    # "/" and "\\" cover os.sep and os.altsep on every platform
+    if username == "" or ".." in username:
+        return False
+    return "/" not in username and "\\" not in username
+
+
+def is_valid_month(month):
+    """
+    Returns:
+        bool: True if month is a valid MM/YYYY between 2000 and 2025,
+        the dates is_valid_date accepts, checked without printing.
+    """
+    key = month_key(month)
+    if key is None:
+        return False
+    # month_label only gives back the same text for MM/YYYY with MM 01-12
+    return month_label(key) == month and 2000 <= key // 12 <= 2025
+
+
+def estimate_user_size(user):
+    """
+    Estimates the memory held by a User and its exercises.
+    Input:
+        user (User): A user whose data has been read.
+    Returns:
+        size (int): Approximate size in bytes.
+    """
+    size = sys.getsizeof(user) + sys.getsizeof(user.__dict__)
+    size += sys.getsizeof(user.exercises)
+
+    for exercise in user.exercises:
+        size += sys.getsizeof(exercise) + sys.getsizeof(exercise.__dict__)
+        size += sys.getsizeof(exercise.name) + sys.getsizeof(exercise.date)
+        size += sys.getsizeof(exercise.distance) + sys.getsizeof(exercise.duration)
+
+    return size
+
+
+class UserCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Initializes an empty LRU cache of parsed users.
+        Input:
+            max_bytes (int): Upper bound on the estimated memory
+            held by cached users.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # username -> (signature, size, user), oldest first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, username):
+        """
+        Returns the parsed User for username, reading the file
+        only if it is not cached or has changed on disk.
+        Input:
+            username (str): The user to look up.
+        Returns:
+            User or None: None if the user has no data file, or the
+            username would reach outside the data folder.
+        """
+        if is_valid_username(username) == False:
+            return None
+
+        filename = username + ".txt"
+        try:
+            status = os.stat(filename)
+        except FileNotFoundError:
+            self.invalidate(username)
+            return None
+
+        signature = (status.st_mtime_ns, status.st_size)
+
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is not None:
+                if entry[0] == signature:
+                    self.hits += 1
+                    self.entries.move_to_end(username)
+                    return entry[2]
+                # File changed since it was cached
+                self._remove(username)
+                self.invalidations += 1
+            self.misses += 1
+
+        # Parse outside the lock so slow reads do not block hits
+        user = User(username)
+        if user.read_data() == False:
+            return None
+        size = estimate_user_size(user)
+
+        with self.lock:
+            if username in self.entries:
+                self._remove(username)
+            self.entries[username] = (signature, size, user)
+            self.current_bytes += size
+
+            # Evict least recently used users, always keeping the newest
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+        return user
+
+    def invalidate(self, username):
+        """
+        Drops username from the cache if present.
+        """
+        with self.lock:
+            if username in self.entries:
+                self._remove(username)
+                self.invalidations += 1
+
+    def _remove(self, username):
+        signature, size, user = self.entries.pop(username)
+        self.current_bytes -= size
+
+    def info(self):
+        """
+        Returns:
+            info (dict): Cache occupancy and hit rate statistics.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            if lookups == 0:
+                hit_rate = 0.0
+            else:
+                hit_rate = round(self.hits / lookups, 4)
+
+            return {
+                "users": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": hit_rate,
+            }
+
+
+class FitnessService:
+    def __init__(self, cache=None):
+        """
+        Initializes the service around a shared user cache.
+        """
+        if cache is None:
+            cache = UserCache()
+        self.cache = cache
+
+    def stats(self, username, exercise, month="all"):
+        """
+        Computes the track_fitness summary for a user.
+        Input:
+            username (str): The user to query.
+            exercise (str): One of swim, run or cycle.
+            month (str): "MM/YYYY" or "all".
+        Returns:
+            (status, body): HTTP style status code and JSON-ready dict.
+        """
+        if is_valid_username(username) == False:
+            return 400, {"error": "Invalid username."}
+
+        if exercise not in SUPPORTED_EXERCISES:
+            return 400, {"error": f"Sorry, {exercise} is not supported."}
+
+        if month == "all":
+            month_key = None
+        elif is_valid_month(month) == False:
+            return 400, {"error": "Invalid month, expected MM/YYYY or all."}
+        else:
+            month_key = month
+
+        user = self.cache.get(username)
+        if user is None:
+            return 404, {"error": f"{username} has no available data."}
+
+        try:
+            summary = calculate_fitness(user, exercise, month_key)
+        except ZeroDivisionError:
+            return 404, {"error": "No matching workouts."}
+
+        summary["username"] = username
+        summary["exercise"] = exercise
+        summary["month"] = month
+        return 200, summary
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/stats":
+            username = query.get("user", [""])[0]
+            exercise = query.get("exercise", [""])[0]
+            month = query.get("month", ["all"])[0]
+            status, body = self.service.stats(username, exercise, month)
+        elif url.path == "/cache":
+            status, body = 200, self.service.cache.info()
+        else:
+            status, body = 404, {"error": "Unknown endpoint."}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet under heavy query load
+        return
+
+
+def make_server(host="127.0.0.1", port=8080, max_bytes=64 * 1024 * 1024):
+    """
+    Builds a threaded HTTP server sharing one user cache.
+    Input:
+        host (str): Interface to bind to.
+        port (int): Port to bind to, 0 picks a free port.
+        max_bytes (int): Memory bound for the user cache.
+    Returns:
+        server (ThreadingHTTPServer): Call serve_forever() to run it.
+    """
+    handler = type(
+        "BoundServiceHandler",
+        (ServiceHandler,),
+        {"service": FitnessService(UserCache(max_bytes))},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class ServiceClient:
+    def __init__(self, host="127.0.0.1", port=8080):
+        """
+        Local client for querying a running service.
+        """
+        self.base_url = f"http://{host}:{port}"
+
+    def _get(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += "?" + urlencode(params)
+        try:
+            with urlopen(url) as response:
+                return json.loads(response.read())
+        except HTTPError as error:
+            return json.loads(error.read())
+
+    def stats(self, username, exercise, month="all"):
+        return self._get(
+            "/stats", {"user": username, "exercise": exercise, "month": month}
+        )
+
+    def cache_info(self):
+        return self._get("/cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitness analytics service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-mb", type=float, default=64)
+    parser.add_argument(
+        "--client",
+        nargs=3,
+        metavar=("USER", "EXERCISE", "MONTH"),
+        help="query a running service instead of starting one",
+    )
+    args = parser.parse_args()
+
+    if args.client:
+        client = ServiceClient(args.host, args.port)
+        print(json.dumps(client.stats(*args.client), indent=2))
+        print(json.dumps(client.cache_info(), indent=2))
+        return
+
+    server = make_server(args.host, args.port, int(args.cache_mb * 1024 * 1024))
+    print(f"Serving fitness analytics on {args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Concurrency-safe access to the <username>.txt workout logs.
+
+Every record is one line. Writers hold an exclusive advisory lock (fcntl)
+and append each batch with a single O_APPEND write, so lines from
+different processes never interleave. Readers hold a shared lock.
+
+A last line without a newline is kept if it parses as a record, as a
+hand-edited log often ends that way. Only an unparseable last line is
+treated as torn, left by a writer that died mid-write, and readers skip
+it. Nothing is ever truncated: before appending, a writer ends the last
+line with a newline, so a torn fragment stays behind as a malformed
+line that parsing skips, exactly as the original read_data did.
+
+GroupCommitWriter batches records from concurrent threads into one
+locked write (and one fsync), so throughput holds up under contention.
+
+On platforms without fcntl the locks are skipped, but single writes
+are still appended atomically by O_APPEND.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def locked(file_descriptor, exclusive=True):
+    """
+    Holds an advisory lock on an open file for a with block.
+    Input:
+        file_descriptor (int): Descriptor of the open file.
+        exclusive (bool): Exclusive lock for writers, shared for readers.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    fcntl.flock(file_descriptor, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+
+
+def parse_record(line):
+    """
+    Parses one log line the same way User.read_data does.
+    Input:
+        line (str): A "name,distance,duration,date" line.
+    Returns:
+        tuple or None: (name, distance, duration, date), or None for
+        blank and malformed lines.
+    """
+    fields = line.strip().split(",")
+    if len(fields) != 4:
+        return None
+
+    name, distance, duration, date = fields
+    try:
+        return name, float(distance), int(duration), date
+    except ValueError:
+        return None
+
+
+def complete_part(data):
+    """
+    Returns:
+        data (bytes): data without a torn trailing record. A last line
+        without a newline is kept when it parses as a record.
+    """
+    end = data.rfind(b"\n") + 1
+    tail = data[end:]
+    if tail == b"" or parse_record(tail.decode("utf-8", errors="replace")) != None:
+        return data
+    return data[:end]
+
+
+def _end_last_line(file_descriptor):
+    # Called with the exclusive lock held, on a descriptor open for
+    # reading as well as appending. os.lseek and os.read work on every
+    # platform, unlike os.pread.
+    if os.fstat(file_descriptor).st_size == 0:
+        return
+    os.lseek(file_descriptor, -1, os.SEEK_END)
+    if os.read(file_descriptor, 1) != b"\n":
+        os.write(file_descriptor, b"\n")
+
+
+def append_records(path, text, fsync=False):
+    """
+    Appends complete records to a log under an exclusive lock.
+    Input:
+        path (str): Log file, created if missing.
+        text (str): One or more lines, each ending in a newline.
+        fsync (bool): Flush the data to disk before returning.
+    """
+    if not text.endswith("\n"):
+        raise ValueError("Records must end with a newline")
+
+    data = text.encode("utf-8")
+    file_descriptor = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        with locked(file_descriptor):
+            _end_last_line(file_descriptor)
+            # os.write may write less than asked, so loop until done
+            view = memoryview(data)
+            while view:
+                written = os.write(file_descriptor, view)
+                view = view[written:]
+            if fsync:
+                os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+
+def read_records(path):
+    """
+    Reads a log under a shared lock.
+    Input:
+        path (str): Log file.
+    Returns:
+        lines (list): Complete lines, without a torn trailing record.
+    Raises:
+        FileNotFoundError: If the log does not exist.
+    """
+    with open(path, "rb") as file_object:
+        with locked(file_object.fileno(), exclusive=False):
+            data = file_object.read()
+    return complete_part(data).decode("utf-8", errors="replace").splitlines()
+
+
+class GroupCommitWriter:
+    def __init__(self, path, fsync=False):
+        """
+        Initializes a writer that batches concurrent appends to one log.
+        Input:
+            path (str): Log file.
+            fsync (bool): Flush each batch to disk before its callers return.
+        """
+        self.path = path
+        self.fsync = fsync
+        self.batches = 0
+        self.records = 0
+        self._condition = threading.Condition()
+        self._pending = []
+        # Batches are numbered; _open is the one collecting records
+        self._open = 1
+        self._done = 0
+        self._flushing = False
+        self._errors = {}
+
+    def append(self, text):
+        """
+        Appends records, returning once they are written. While one
+        thread writes a batch, records from other threads collect
+        and go out together in the next batch.
+        Input:
+            text (str): One or more lines, each ending in a newline.
+        """
+        if not text.endswith("\n"):
+            raise ValueError("Records must end with a newline")
+
+        with self._condition:
+            self._pending.append(text)
+            batch = self._open
+            while self._done < batch and self._flushing:
+                self._condition.wait()
+
+            if self._done < batch:
+                # Nobody is writing, so this thread writes the batch
+                self._flushing = True
+                records = self._pending
+                self._pending = []
+                self._open += 1
+                self._condition.release()
+                try:
+                    append_records(self.path, "".join(records), self.fsync)
+                except Exception as error:
+                    self._errors[batch] = error
+                finally:
+                    self._condition.acquire()
+                    self.batches += 1
+                    self.records += len(records)
+                    self._done = batch
+                    self._flushing = False
+                    self._condition.notify_all()
+
+            error = self._errors.get(batch)
+        if error is not None:
+            raise error
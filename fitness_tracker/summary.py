@@ -0,0 +1,306 @@
+"""
+Precomputed per-user summary kept next to <username>.txt.
+
+The sidecar file <username>.summary stores, for every exercise and
+month (and "all" months), the workout count, distance and duration
+sums, max distance and max speed. log_workout updates it as lines are
+appended, so stats and goals are answered without re-reading the log.
+
+The sidecar also stores the MonthIndex for date-range queries, so
+its sorted month keys and prefix sums are built once per update
+rather than once per query.
+
+The sidecar records the size, mtime and CRC32 of the log it describes.
+It is rebuilt from the log whenever the size shrinks, or the mtime
+changes without the checksum still matching. Appends are folded in
+only after the bytes already covered pass the same checksum. A
+sidecar that cannot be written, as in a read-only folder, is skipped
+and the summary is used from memory.
+"""
+import json
+import os
+import tempfile
+import zlib
+
+from storage import locked, parse_record
+from timeseries import MonthIndex
+
+# Version 2 adds the month index
+SUMMARY_VERSION = 2
+
+
+def log_path(username, directory=""):
+    return os.path.join(directory, username + ".txt")
+
+
+def summary_path(username, directory=""):
+    return os.path.join(directory, username + ".summary")
+
+
+class Summary:
+    def __init__(self, groups=None, log_size=0, log_mtime=0, log_crc=0, index=None):
+        """
+        Initializes a summary.
+        Input:
+            groups (dict): Maps (exercise, month) to
+            [count, distance, duration, max distance, max speed].
+            log_size (int): Size in bytes of the summarised log.
+            log_mtime (int): Modification time (ns) of the log.
+            log_crc (int): CRC32 of the summarised log.
+            index (MonthIndex): Index over groups, None to build it
+            when first needed.
+        """
+        if groups is None:
+            groups = {}
+        self.groups = groups
+        self.log_size = log_size
+        self.log_mtime = log_mtime
+        self.log_crc = log_crc
+        self.index = index
+
+    def add(self, name, distance, duration, date):
+        """
+        Adds one workout to its month and all-time groups.
+        """
+        if duration == 0:
+            speed = 0
+        else:
+            # Converting from km per mins to km per hour
+            speed = (distance / duration) * 60
+
+        # The index no longer matches the groups
+        self.index = None
+        for month in (date, "all"):
+            group = self.groups.get((name, month))
+            if group is None:
+                # Start the sums from 0 like the User calculations
+                group = [0, 0, 0, 0, 0]
+                self.groups[(name, month)] = group
+            group[0] += 1
+            group[1] += distance
+            group[2] += duration
+            if distance > group[3]:
+                group[3] = distance
+            if speed > group[4]:
+                group[4] = speed
+
+    def add_bytes(self, data):
+        """
+        Adds every record in data, as read from the log.
+        """
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            workout = parse_record(line)
+            if workout is not None:
+                self.add(*workout)
+
+    def month_index(self):
+        """
+        Returns:
+            index (MonthIndex): The index over groups, built if missing.
+        """
+        if self.index is None:
+            self.index = MonthIndex(self.groups)
+        return self.index
+
+    def _group(self, exercise_name, month):
+        if month == None:
+            month = "all"
+        return self.groups.get((exercise_name, month), (0, 0, 0, 0, 0))
+
+    # The methods below mirror User so that calculate_fitness and
+    # calculate_goal accept a Summary in place of a User.
+
+    def count_matching_data(self, exercise_name, month):
+        return self._group(exercise_name, month)[0]
+
+    def calculate_distance(self, exercise_name, month):
+        return self._group(exercise_name, month)[1]
+
+    def calculate_duration(self, exercise_name, month):
+        return self._group(exercise_name, month)[2]
+
+    def calculate_max_distance(self, exercise_name):
+        return self._group(exercise_name, None)[3]
+
+    def calculate_max_speed(self, exercise_name):
+        return self._group(exercise_name, None)[4]
+
+    def to_json(self):
+        groups = {
+            name + "|" + month: group for (name, month), group in self.groups.items()
+        }
+        return json.dumps(
+            {
+                "version": SUMMARY_VERSION,
+                "log_size": self.log_size,
+                "log_mtime": self.log_mtime,
+                "log_crc": self.log_crc,
+                "groups": groups,
+                "index": self.month_index().to_json(),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        if data.get("version") != SUMMARY_VERSION:
+            raise ValueError("Unsupported summary version")
+
+        groups = {}
+        for key, group in data["groups"].items():
+            name, month = key.split("|", 1)
+            groups[(name, month)] = group
+
+        index = MonthIndex.from_json(data["index"])
+        return cls(groups, data["log_size"], data["log_mtime"], data["log_crc"], index)
+
+
+def read_summary(username, directory=""):
+    """
+    Returns:
+        Summary or None: The stored sidecar, or None if it is
+        missing or unreadable.
+    """
+    try:
+        with open(summary_path(username, directory), "r") as file_object:
+            return Summary.from_json(file_object.read())
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_summary(summary, username, directory=""):
+    """
+    Writes the sidecar atomically so readers never see half a file.
+    """
+    path = summary_path(username, directory)
+    # A temporary name per writer, so concurrent updates never share one
+    file_descriptor, temporary = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory or "."
+    )
+    try:
+        with os.fdopen(file_descriptor, "w") as file_object:
+            file_object.write(summary.to_json())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _store(summary, username, directory):
+    # The sidecar is only a cache, so a read-only folder still answers
+    # queries from the summary built in memory
+    try:
+        write_summary(summary, username, directory)
+    except OSError:
+        pass
+
+
+def rebuild_summary(username, directory=""):
+    """
+    Recomputes the sidecar from the full log.
+    Returns:
+        Summary or None: None if the user has no log.
+    """
+    try:
+        with open(log_path(username, directory), "rb") as file_object:
+            with locked(file_object.fileno(), exclusive=False):
+                data = file_object.read()
+                status = os.fstat(file_object.fileno())
+    except FileNotFoundError:
+        return None
+
+    # add_bytes skips a torn trailing fragment like any malformed line,
+    # and writers never extend it, so the sidecar covers the whole log
+    summary = Summary(None, len(data), status.st_mtime_ns, zlib.crc32(data))
+    summary.add_bytes(data)
+    _store(summary, username, directory)
+    return summary
+
+
+def _file_crc(file_object, size):
+    # CRC32 of the first size bytes of an open file
+    crc = 0
+    file_object.seek(0)
+    remaining = size
+    while remaining > 0:
+        block = file_object.read(min(remaining, 1 << 20))
+        if not block:
+            break
+        crc = zlib.crc32(block, crc)
+        remaining -= len(block)
+    return crc
+
+
+def _log_crc(path, size):
+    with open(path, "rb") as file_object:
+        return _file_crc(file_object, size)
+
+
+def load_summary(username, directory="", verify=False):
+    """
+    Returns an up to date summary, rebuilding it if the log changed.
+    Input:
+        username (str): The user to summarise.
+        directory (str): Folder holding the user's files.
+        verify (bool): Always compare the log checksum, even when
+        its size and mtime match the sidecar.
+    Returns:
+        Summary or None: None if the user has no log.
+    """
+    try:
+        status = os.stat(log_path(username, directory))
+    except FileNotFoundError:
+        return None
+
+    summary = read_summary(username, directory)
+    if summary is None or summary.log_size != status.st_size:
+        return rebuild_summary(username, directory)
+
+    if verify or summary.log_mtime != status.st_mtime_ns:
+        # Same size but touched since: trust it only if the bytes match
+        if _log_crc(log_path(username, directory), status.st_size) != summary.log_crc:
+            return rebuild_summary(username, directory)
+        summary.log_mtime = status.st_mtime_ns
+        _store(summary, username, directory)
+
+    return summary
+
+
+def update_summary(username, directory=""):
+    """
+    Folds lines appended to the log since the sidecar was written
+    into the sidecar. The bytes it already covers are checked against
+    its checksum first, and the sidecar is rebuilt if they changed.
+    Returns:
+        Summary or None: None if the user has no log.
+    """
+    path = log_path(username, directory)
+    summary = read_summary(username, directory)
+
+    try:
+        file_object = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with file_object:
+        with locked(file_object.fileno(), exclusive=False):
+            status = os.fstat(file_object.fileno())
+            if summary is None or summary.log_size > status.st_size:
+                # No usable sidecar, or the log was truncated
+                appended = None
+            elif _file_crc(file_object, summary.log_size) != summary.log_crc:
+                # Lines the sidecar already counted were edited
+                appended = None
+            else:
+                file_object.seek(summary.log_size)
+                appended = file_object.read()
+
+    if appended is None:
+        return rebuild_summary(username, directory)
+
+    summary.add_bytes(appended)
+    summary.log_size += len(appended)
+    summary.log_mtime = status.st_mtime_ns
+    summary.log_crc = zlib.crc32(appended, summary.log_crc)
+    _store(summary, username, directory)
+    return summary
@@ -0,0 +1,262 @@
+"""
+Date-range and time-series queries over fitness logs.
+
+Dates are parsed once into integer month keys (year * 12 + month - 1),
+which sort chronologically. For each exercise, MonthIndex keeps the
+months that have workouts in sorted order, with prefix sums of counts,
+distances and durations. Range totals then take two bisects instead of
+a scan over every workout.
+
+The summary sidecar stores the index next to its groups, so queries
+answered from it load the sorted keys and prefix sums as they are.
+"""
+from bisect import bisect_left, bisect_right
+
+
+def month_key(date):
+    """
+    Converts "MM/YYYY" into a sortable month number.
+    Input:
+        date (str): A date in MM/YYYY form.
+    Returns:
+        key (int or None): year * 12 + (month - 1), or None if malformed.
+    """
+    try:
+        month, year = date.split("/")
+        return int(year) * 12 + int(month) - 1
+    except ValueError:
+        return None
+
+
+def month_label(key):
+    """
+    Converts a month number from month_key back into "MM/YYYY".
+    """
+    year, month = divmod(key, 12)
+    return f"{month + 1:02d}/{year}"
+
+
+def parse_month_range(text):
+    """
+    Splits a range like "03/2023 to 11/2024" into its two dates.
+    Returns:
+        (start, end) or None: The two MM/YYYY strings, or None if
+        text is not a range.
+    """
+    parts = text.split(" to ")
+    if len(parts) != 2:
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+class ExerciseSeries:
+    def __init__(self, months):
+        """
+        Builds the sorted index for one exercise.
+        Input:
+            months (dict): Maps month key to
+            [count, distance, duration, max distance].
+        """
+        self.keys = sorted(months)
+        self.counts = [months[key][0] for key in self.keys]
+        self.distances = [months[key][1] for key in self.keys]
+        self.durations = [months[key][2] for key in self.keys]
+        self.max_distances = [months[key][3] for key in self.keys]
+
+        # Prefix sums: entry i holds the total of the first i months
+        self.count_sums = [0]
+        self.distance_sums = [0]
+        self.duration_sums = [0]
+        for count, distance, duration in zip(self.counts, self.distances, self.durations):
+            self.count_sums.append(self.count_sums[-1] + count)
+            self.distance_sums.append(self.distance_sums[-1] + distance)
+            self.duration_sums.append(self.duration_sums[-1] + duration)
+
+    def bounds(self, start=None, end=None):
+        """
+        Returns:
+            (low, high): Positions of the first month at or after start
+            and just past the last month at or before end.
+        """
+        low = 0 if start is None else bisect_left(self.keys, start)
+        high = len(self.keys) if end is None else bisect_right(self.keys, end)
+        return low, max(low, high)
+
+    def to_json(self):
+        return {
+            "keys": self.keys,
+            "counts": self.counts,
+            "distances": self.distances,
+            "durations": self.durations,
+            "max_distances": self.max_distances,
+            "count_sums": self.count_sums,
+            "distance_sums": self.distance_sums,
+            "duration_sums": self.duration_sums,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Restores a stored series without sorting or summing again.
+        """
+        series = cls({})
+        series.keys = data["keys"]
+        series.counts = data["counts"]
+        series.distances = data["distances"]
+        series.durations = data["durations"]
+        series.max_distances = data["max_distances"]
+        series.count_sums = data["count_sums"]
+        series.distance_sums = data["distance_sums"]
+        series.duration_sums = data["duration_sums"]
+        return series
+
+
+class MonthIndex:
+    def __init__(self, groups):
+        """
+        Initializes the index from grouped workouts.
+        Input:
+            groups (dict): Maps (exercise, MM/YYYY) to a list starting
+            with count, distance, duration and max distance. Summary
+            groups and "all" entries are accepted; malformed dates
+            and "all" are skipped.
+        """
+        by_exercise = {}
+        for (name, date), group in groups.items():
+            key = month_key(date)
+            if key is None:
+                continue
+            by_exercise.setdefault(name, {})[key] = list(group[:4])
+
+        self.series = {name: ExerciseSeries(months) for name, months in by_exercise.items()}
+
+    @classmethod
+    def from_summary(cls, summary):
+        """
+        Returns the Summary's index, which is loaded with the sidecar
+        and only rebuilt after new workouts are added.
+        """
+        return summary.month_index()
+
+    def to_json(self):
+        return {name: series.to_json() for name, series in self.series.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        index = cls({})
+        index.series = {name: ExerciseSeries.from_json(series) for name, series in data.items()}
+        return index
+
+    def totals(self, exercise_name, start=None, end=None):
+        """
+        Totals an exercise over a range of months.
+        Input:
+            exercise_name (str): Exercise to total.
+            start (int): First month key, None for the earliest.
+            end (int): Last month key (inclusive), None for the latest.
+        Returns:
+            totals (dict): count, distance, duration and max_distance.
+        """
+        series = self.series.get(exercise_name)
+        if series is None:
+            return {"count": 0, "distance": 0, "duration": 0, "max_distance": 0}
+
+        low, high = series.bounds(start, end)
+        return {
+            "count": series.count_sums[high] - series.count_sums[low],
+            "distance": series.distance_sums[high] - series.distance_sums[low],
+            "duration": series.duration_sums[high] - series.duration_sums[low],
+            "max_distance": max(series.max_distances[low:high], default=0),
+        }
+
+    def monthly(self, exercise_name, start=None, end=None):
+        """
+        Returns a per-month series, including months with no workouts.
+        Returns:
+            series (list): [(MM/YYYY, count, distance, duration), ...]
+        """
+        series = self.series.get(exercise_name)
+        if series is None or series.keys == []:
+            return []
+
+        if start is None:
+            start = series.keys[0]
+        if end is None:
+            end = series.keys[-1]
+        low, high = series.bounds(start, end)
+
+        filled = []
+        position = low
+        for key in range(start, end + 1):
+            if position < high and series.keys[position] == key:
+                filled.append(
+                    (
+                        month_label(key),
+                        series.counts[position],
+                        round(series.distances[position], 1),
+                        series.durations[position],
+                    )
+                )
+                position += 1
+            else:
+                filled.append((month_label(key), 0, 0.0, 0))
+        return filled
+
+    def rolling(self, exercise_name, window=3, start=None, end=None):
+        """
+        Computes rolling totals over the previous window months,
+        using the prefix sums so each point is two bisects.
+        Returns:
+            trend (list): [(MM/YYYY, distance, duration, average speed), ...]
+            with the speed in km/h over the window.
+        """
+        series = self.series.get(exercise_name)
+        if series is None or series.keys == []:
+            return []
+
+        if start is None:
+            start = series.keys[0]
+        if end is None:
+            end = series.keys[-1]
+
+        trend = []
+        for key in range(start, end + 1):
+            low, high = series.bounds(key - window + 1, key)
+            distance = series.distance_sums[high] - series.distance_sums[low]
+            duration = series.duration_sums[high] - series.duration_sums[low]
+            if duration == 0:
+                speed = 0.0
+            else:
+                speed = round((distance / duration) * 60, 2)
+            trend.append((month_label(key), round(distance, 1), duration, speed))
+        return trend
+
+    def view(self, start=None, end=None):
+        """
+        Returns:
+            view (RangeView): The range as an object calculate_fitness
+            accepts in place of a User.
+        """
+        return RangeView(self, start, end)
+
+
+class RangeView:
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+
+    # The methods below mirror User for a fixed range of months,
+    # so the month argument is ignored.
+
+    def count_matching_data(self, exercise_name, month):
+        return self.index.totals(exercise_name, self.start, self.end)["count"]
+
+    def calculate_distance(self, exercise_name, month):
+        return self.index.totals(exercise_name, self.start, self.end)["distance"]
+
+    def calculate_duration(self, exercise_name, month):
+        return self.index.totals(exercise_name, self.start, self.end)["duration"]
+
+    def calculate_max_distance(self, exercise_name):
+        return self.index.totals(exercise_name, self.start, self.end)["max_distance"]
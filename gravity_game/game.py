@@ -1,33 +1,99 @@
-
 def gravity_decorator(insert_method):
     """
     Decorator that applies a gravity effect to a game board 
     after a piece is inserted.
     Input:
         insert_method (function): The original method that 
-        inserts a piece into the board.
+        inserts a piece into the board. It returns False if the
+        piece did not fit, otherwise a list of (piece, row, column)
+        effects to apply where pieces landed.
     Output:
         function: A wrapped version of the insert method 
-        with gravity applied.
+        with the effects and one gravity pass applied by apply_effects.
     """
     def wrapper(self, board, column):
-        if insert_method(self, board, column) == True:
-            # Iterate over each column from right to left
-            # and over each row from second-to-last upwards
-            for col in range(board.columns - 1, -1, -1):
-                for row in range(board.rows - 2, -1, -1):
-                    # Check if cell below the current one is empty
-                    for offset in range((board.rows - 1) - row, 0, -1):
-                        if board.grid[row + offset][col] == " ":
-                            board.grid[row + offset][col] = board.grid[row][col]
-                            board.grid[row][col] = " "
-                            # Stop once the piece has fallen to lowest empty spot
-                            break 
-            return True
-        return False  # Return False if insertion failed
+        effects = insert_method(self, board, column)
+        if effects is False:
+            return False  # Return False if insertion failed
+        apply_effects(board, effects)
+        return True
     return wrapper
 
 
+def apply_gravity(board, columns=None):
+    """
+    Lets every piece on the board fall to the lowest empty cell
+    below it.
+    Input:
+        board (Board): The game board object.
+        columns (iterable): 0-based columns to settle, or None for
+        all of them. Columns no effect touched are already settled,
+        so passing only the touched ones gives the same board.
+    Returns:
+        int: The number of pieces that moved.
+    """
+    if columns is None:
+        columns = range(board.columns)
+
+    moved = 0
+    # Iterate over each column from right to left
+    # and over each row from second-to-last upwards
+    for col in sorted(columns, reverse=True):
+        for row in range(board.rows - 2, -1, -1):
+            # Check if cell below the current one is empty
+            for offset in range((board.rows - 1) - row, 0, -1):
+                if board.grid[row + offset][col] == " ":
+                    if board.grid[row][col] != " ":
+                        moved += 1
+                    board.grid[row + offset][col] = board.grid[row][col]
+                    board.grid[row][col] = " "
+                    # Stop once the piece has fallen to lowest empty spot
+                    break 
+    return moved
+
+
+# Maps a piece symbol to the Piece class Player.add_piece creates for it
+PIECE_TYPES = {}
+
+
+def register_piece(symbol, piece_class=None):
+    """
+    Registers the class used for pieces with the given symbol.
+    Can be called directly or used as a class decorator.
+    Input:
+        symbol (str): The piece symbol, e.g. "B".
+        piece_class (type): A Piece subclass taking the symbol.
+    Returns:
+        The class, or a decorator that registers one.
+    """
+    def decorator(piece_class):
+        PIECE_TYPES[symbol] = piece_class
+        return piece_class
+
+    if piece_class is None:
+        return decorator
+    return decorator(piece_class)
+
+
+def apply_effects(board, effects):
+    """
+    Applies several piece effects, then one gravity pass over only
+    the columns they touched.
+    Input:
+        board (Board): The game board object.
+        effects (list): (piece, row, column) for each landed
+        EffectPiece, with 0-based row and column.
+    Returns:
+        set: The 0-based columns the effects touched.
+    """
+    touched = set()
+    for piece, row, column in effects:
+        touched.update(piece.effect(board, row, column))
+    if touched:
+        apply_gravity(board, touched)
+    return touched
+
+
 class Board:
     def __init__(self, rows, columns):
         """
@@ -100,8 +166,20 @@ class Piece:
         Returns:
             bool: True if the piece was successfully inserted, False otherwise.
         """
+        return self.place(board, column) != None
+
+    def place(self, board, column):
+        """
+        Drops the piece into the specified column of the board.
+        Args:
+            board (Board): The game board where the piece will be placed.
+            column (int): The 1-based index of the column to insert the piece into.
+        Returns:
+            int or None: The 0-based row the piece landed in, or None if
+            the column is full or off the board.
+        """
         if column > board.columns:
-            return False
+            return None
 
         column_index = column - 1  # Convert to 0-based index
 
@@ -110,9 +188,9 @@ class Piece:
             if board.grid[row][column_index] == " ":
                 # Place the piece in the first available empty cell
                 board.grid[row][column_index] = self.symbol
-                return True  # Exit after successful insertion
+                return row  # Exit after successful insertion
 
-        return False
+        return None
 
 
 class Player:
@@ -133,15 +211,10 @@ class Player:
             symbol (str): The symbol to assign to each piece.
             quantity (int): The number of pieces to add.
         """
+        # Special symbols get their registered class, others a plain Piece
+        piece_class = PIECE_TYPES.get(symbol, Piece)
         for i in range(quantity):
-            if symbol == "B":
-                piece = BombPiece(symbol)
-            elif symbol == "T":
-                piece = TeleportPiece(symbol)
-            else:
-                piece = Piece(symbol)
-                
-            self.pieces.append(piece)
+            self.pieces.append(piece_class(symbol))
 
     def choose_piece(self):
         """
@@ -448,11 +521,72 @@ class Game:
             self.begin(False)
 
 
-class BombPiece(Piece):
+class EffectPiece(Piece):
+    """
+    A game piece with an effect where it lands. Subclasses implement
+    effect(), which changes the board and returns the columns it
+    touched; gravity then runs on those columns only.
+    Inherits from the base Piece class.
+    """
+    @gravity_decorator
+    def insert(self, board, column):
+        """
+        Inserts the piece and applies its effect at the landing cell.
+        Input:
+            board (Board): The game board object.
+            column (int): The column 1-based index where the piece should be inserted.
+        Returns:
+            bool: True if the piece was successfully inserted, False otherwise.
+            gravity_decorator applies the effect and settles the columns
+            it touched.
+        """
+        row = self.place(board, column)
+        if row == None:
+            return False
+
+        # Same cell Piece.place used, including a wrapped column 0
+        column_index = (column - 1) % board.columns
+        return [(self, row, column_index)]
+
+    def effect(self, board, row, column):
+        """
+        Applies the effect of a piece that landed at row, column.
+        Returns:
+            set: 0-based columns whose cells changed.
+        """
+        raise NotImplementedError
+
+
+class ClearPiece(EffectPiece):
+    """
+    A piece that empties the cells of its footprint when it lands.
+    """
+    def footprint(self, board, row, column):
+        """
+        Returns:
+            list: (row, column) cells to clear. Indices follow list
+            indexing, so -1 wraps to the last row or column and cells
+            past the board are skipped.
+        """
+        raise NotImplementedError
+
+    def effect(self, board, row, column):
+        touched = set()
+        for cell_row, cell_column in self.footprint(board, row, column):
+            try:
+                board.grid[cell_row][cell_column] = ' '
+            except IndexError:
+                continue
+            touched.add(cell_column % board.columns)
+        return touched
+
+
+@register_piece("B")
+class BombPiece(ClearPiece):
     """
     A special game piece that clears a 3x3 area centered 
     on its position, when inserted.
-    Inherits from the base Piece class.
+    Inherits from the ClearPiece class.
     """
     def __init__(self, symbol= "B"):
         """
@@ -460,57 +594,24 @@ class BombPiece(Piece):
         """
         super().__init__(symbol)
 
-    @gravity_decorator
-    def insert(self, board, column):
+    def footprint(self, board, row, column):
         """
-        Inserts the BombPiece into the specified column of the board, 
-        which clears a 3x3 area centered on the bomb's location.
-        Input:
-            board (Board): The game board object.
-            column (int): The column 1-base index where the piece should be inserted.
         Returns:
-            bool: True if the piece was successfully inserted and exploded, False otherwise.
-        """
-        if super().insert(board, column) == True:
-            # Find the location of the Bomb on the board
-            found = False
-            for row in range(0, board.rows):
-                for col in range(0, board.columns):
-                    if board.grid[row][col] == "B":
-                        row_index = row
-                        col_index = col
-                        found = True
-                        break
-                if found:
-                    break
-            
-            # Clear the 3x3 area centered on the bomb
-            for i in range(col_index - 1, col_index + 2):
-                try:
-                    board.grid[row_index - 1][i] = ' '
-                except IndexError:
-                    continue
-            for i in range(col_index - 1, col_index + 2):
-                try:
-                    board.grid[row_index][i] = ' '
-                except IndexError:
-                    continue
-            for i in range(col_index - 1, col_index + 2):
-                try:
-                    board.grid[row_index + 1][i] = ' '
-                except IndexError:
-                    continue
-
-            return True
-            
-        return False
-        
+            list: The 3x3 area centered on the bomb.
+        """
+        return [
+            (cell_row, cell_column)
+            for cell_row in range(row - 1, row + 2)
+            for cell_column in range(column - 1, column + 2)
+        ]
 
-class TeleportPiece(Piece):
+
+@register_piece("T")
+class TeleportPiece(EffectPiece):
     """
     A special game piece that swaps its position 
     with the mirrored position across the center of the board.
-    Inherits from the base Piece class.
+    Inherits from the EffectPiece class.
     """
     def __init__(self, symbol= "T"):
         """
@@ -518,53 +619,64 @@ class TeleportPiece(Piece):
         """
         super().__init__(symbol)
 
-    @gravity_decorator
-    def insert(self, board, column):
+    def effect(self, board, row_index, col_index):
         """
-        Inserts the TeleportPiece into the specified column of the board.
-        If successfully inserted, it swaps its position with the mirrored position
-        across the center of the board.
-        Input:
-            board (Board): The game board object.
-            column (int): The column 1-based index where the piece should be inserted.
+        Moves the piece at the mirrored position into the teleport's
+        cell and empties the mirrored cell.
         Returns:
-            bool: True if the piece was successfully inserted and teleported, False otherwise.
-        """
-        if super().insert(board, column) == True:
-            # Find location of Teleport 
-            found = False
-            for row in range(0, board.rows):
-                for col in range(0, board.columns):
-                    if board.grid[row][col] == "T":
-                        row_index = row
-                        col_index = col
-                        found = True
-                        break
-                if found:
-                    break
+            set: The teleport's column and the mirrored column.
+        """
+        # Calculate the mirrored position across the center of the board
+        mid_column = board.columns // 2
+        mid_row = board.rows // 2
+
+        offset_vertical = row_index - mid_row
+        offset_horizontal = col_index - mid_column
 
-            # Calculate the mirrored position across the center of the board
-            mid_column = board.columns // 2
-            mid_row = board.rows // 2
+        mirrored_row = mid_row - offset_vertical
+        mirrored_col = mid_column - offset_horizontal
 
-            offset_vertical = row_index - mid_row
-            offset_horizontal = col_index - mid_column
+        # Override Teleport piece with the mirrored position
+        mirrored_piece = board.grid[mirrored_row][mirrored_col]
+        board.grid[row_index][col_index] = mirrored_piece
+        
+        # Update replaced board index to empty
+        board.grid[mirrored_row][mirrored_col] = ' '
 
-            mirrored_row = mid_row - offset_vertical
-            mirrored_col = mid_column - offset_horizontal
+        return {col_index, mirrored_col % board.columns}
 
-            # Override Teleport piece with the mirrored position
-            mirrored_piece = board.grid[mirrored_row][mirrored_col]
-            board.grid[row_index][col_index] = mirrored_piece
-            
-            # Update replaced board index to empty
-            board.grid[mirrored_row][mirrored_col] = ' '
-            
-            return True
-            
-        return False
 
+class RowClearPiece(ClearPiece):
+    """
+    An example special piece that clears the whole row it lands in.
+    Not dealt by Game.setup; register it with register_piece to use it.
+    """
+    def footprint(self, board, row, column):
+        """
+        Returns:
+            list: Every cell in the landing row.
+        """
+        return [(row, cell_column) for cell_column in range(board.columns)]
+
+
+class ColumnSwapPiece(EffectPiece):
+    """
+    An example special piece that vanishes and swaps the contents of
+    its column with the mirrored column.
+    Not dealt by Game.setup; register it with register_piece to use it.
+    """
+    def effect(self, board, row, column):
+        """
+        Returns:
+            set: The landing column and the mirrored column.
+        """
+        board.grid[row][column] = ' '
+        mirrored = board.columns - 1 - column
+        for grid_row in board.grid:
+            grid_row[column], grid_row[mirrored] = grid_row[mirrored], grid_row[column]
+        return {column, mirrored}
 
 
-game = Game(5, 5)
-game.begin()
\ No newline at end of file
+if __name__ == "__main__":
+    game = Game(5, 5)
+    game.begin()
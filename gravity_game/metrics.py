@@ -0,0 +1,264 @@
+"""
+Opt-in instrumentation for the gravity game.
+
+Nothing in game.py is timed by default. instrument() swaps timing
+wrappers in for the methods of interest and uninstrument() puts the
+originals back, so a game that is not instrumented runs exactly the
+original code.
+
+Usage:
+    metrics = GameMetrics()
+    with instrumented(metrics):
+        game.begin()
+    metrics.save("metrics.json")
+"""
+import json
+import time
+from contextlib import contextmanager
+
+import game
+
+
+class Histogram:
+    def __init__(self, bounds):
+        """
+        Initializes an empty histogram.
+        Input:
+            bounds (list): Ascending upper bounds of each bucket; values
+            above the last bound go in an overflow bucket.
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def summary(self):
+        """
+        Returns:
+            summary (dict): Count, total, mean, min, max and bucket counts.
+        """
+        buckets = {}
+        for bound, count in zip(self.bounds, self.counts):
+            buckets[f"<={bound}"] = count
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.minimum,
+            "max": self.maximum,
+            "buckets": buckets,
+        }
+
+
+# Microsecond buckets for timings, doubling each step
+TIME_BOUNDS = [2 ** power for power in range(0, 21)]
+# Pieces moved by one gravity pass
+CELL_BOUNDS = [0, 1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class GameMetrics:
+    def __init__(self):
+        """
+        Initializes empty timers and counters for one game.
+        """
+        self.timers = {}
+        self.counters = {}
+        self.cells_moved = Histogram(CELL_BOUNDS)
+        self.turn_latency = Histogram(TIME_BOUNDS)
+        # Engine time in the current turn, excluding waits for input
+        self.turn_time = 0.0
+        self.depth = 0
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_time(self, name, seconds):
+        """
+        Records a timing under name. Only the outermost timed call
+        counts towards the turn, so nested calls are not counted twice.
+        """
+        histogram = self.timers.get(name)
+        if histogram is None:
+            histogram = Histogram(TIME_BOUNDS)
+            self.timers[name] = histogram
+        histogram.record(seconds * 1e6)
+        if self.depth == 0:
+            self.turn_time += seconds
+
+    def end_turn(self):
+        """
+        Closes the current turn and records its latency.
+        """
+        if self.turn_time > 0:
+            self.turn_latency.record(self.turn_time * 1e6)
+            self.count("turns")
+        self.turn_time = 0.0
+
+    def report(self):
+        """
+        Returns:
+            report (dict): Timers in microseconds, counters, cells
+            moved per gravity pass and turn latency.
+        """
+        self.end_turn()
+        return {
+            "timers_us": {name: timer.summary() for name, timer in sorted(self.timers.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "gravity_cells_moved": self.cells_moved.summary(),
+            "turn_latency_us": self.turn_latency.summary(),
+        }
+
+    def save(self, file_name):
+        with open(file_name, "w") as file_object:
+            json.dump(self.report(), file_object, indent=2)
+
+
+def _timed(metrics, name, method):
+    def wrapper(*args, **kwargs):
+        metrics.depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.depth -= 1
+            metrics.add_time(name, elapsed)
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _timed_gravity(metrics, apply_gravity):
+    def wrapper(board, columns=None):
+        metrics.depth += 1
+        start = time.perf_counter()
+        try:
+            moved = apply_gravity(board, columns)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.depth -= 1
+            metrics.add_time("gravity", elapsed)
+        metrics.cells_moved.record(moved)
+        metrics.count("gravity.passes")
+        return moved
+    wrapper.__wrapped__ = apply_gravity
+    return wrapper
+
+
+def _counted_insert(metrics, name, insert):
+    timed = _timed(metrics, name, insert)
+
+    def wrapper(self, board, column):
+        inserted = timed(self, board, column)
+        if inserted:
+            metrics.count(name + ".ok")
+        else:
+            metrics.count(name + ".failed")
+        return inserted
+    wrapper.__wrapped__ = insert
+    return wrapper
+
+
+def _counted_effect_insert(metrics, insert):
+    # One patch on EffectPiece covers every effect piece, registered or
+    # not, each recorded under its class name, e.g. BombPiece as bomb.insert
+    counted = {}
+
+    def wrapper(self, board, column):
+        piece_class = type(self)
+        if piece_class not in counted:
+            name = piece_class.__name__.lower()
+            if name.endswith("piece"):
+                name = name[:-len("piece")]
+            counted[piece_class] = _counted_insert(metrics, name + ".insert", insert)
+        return counted[piece_class](self, board, column)
+    wrapper.__wrapped__ = insert
+    return wrapper
+
+
+def _turn_boundary(metrics, method):
+    def wrapper(*args, **kwargs):
+        metrics.end_turn()
+        return method(*args, **kwargs)
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+# Originals replaced by instrument(), restored by uninstrument()
+_originals = []
+
+
+def instrument(metrics, module=game):
+    """
+    Starts recording into metrics. Times Piece.insert, every effect
+    piece's insert (which includes its effect and gravity pass), the
+    gravity pass itself, check_win and Board.__repr__.
+    Input:
+        metrics (GameMetrics): Where to record.
+        module: The game module to patch.
+    """
+    if _originals:
+        raise RuntimeError("Game is already instrumented")
+
+    patches = [
+        (module.Piece, "insert", _counted_insert(metrics, "piece.insert", module.Piece.insert)),
+        (module.EffectPiece, "insert", _counted_effect_insert(metrics, module.EffectPiece.insert)),
+        (module, "apply_gravity", _timed_gravity(metrics, module.apply_gravity)),
+        (module.Game, "check_win", _timed(metrics, "check_win", module.Game.check_win)),
+        (module.Board, "__repr__", _timed(metrics, "board.repr", module.Board.__repr__)),
+        # A turn ends when play passes to the other player
+        (module.Game, "change_player", _turn_boundary(metrics, module.Game.change_player)),
+    ]
+    for owner, name, wrapper in patches:
+        # None marks a method the owner inherits rather than defines
+        _originals.append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, wrapper)
+
+
+def uninstrument():
+    """
+    Restores the original, untimed methods.
+    """
+    while _originals:
+        owner, name, original = _originals.pop()
+        if original is None:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+
+@contextmanager
+def instrumented(metrics, module=game):
+    """
+    Records into metrics for the duration of a with block.
+    """
+    instrument(metrics, module)
+    try:
+        yield metrics
+    finally:
+        uninstrument()
+
+
+if __name__ == "__main__":
+    # Play an interactive 5x5 game and print its metrics afterwards
+    metrics = GameMetrics()
+    with instrumented(metrics):
+        game.Game(5, 5).begin()
+    print(json.dumps(metrics.report(), indent=2))
@@ -0,0 +1,457 @@
+"""
+Round-robin tournaments between gravity game AI policies.
+
+Every ordered pair of policies plays a number of games on every board
+size and special-piece inventory in the matrix. Games run headless,
+without recursion or input(), in a process pool. Each result is
+appended to a JSON lines file as soon as it finishes, and Elo ratings
+are updated as results arrive.
+
+The results file is also the checkpoint. Rerunning the same command
+reads it, replays the finished games into the ratings and plays only
+the games that are missing, so an interrupted tournament resumes
+where it stopped.
+
+Usage:
+    python tournament.py results.jsonl [--policies random center greedy]
+        [--sizes 5x5 6x7] [--inventories standard none] [--games 10]
+        [--seed 0] [--workers 8] [--ratings ratings.json]
+"""
+import argparse
+import json
+import os
+import random
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from game import PIECE_TYPES, ColumnSwapPiece, Game, Piece, Player, RowClearPiece
+
+# The example pieces are not registered for normal games, so the
+# tournament deals them from its own mapping instead of changing
+# game.PIECE_TYPES
+EXAMPLE_PIECES = {"R": RowClearPiece, "S": ColumnSwapPiece}
+
+# Special pieces per board, as one piece for every N cells
+INVENTORIES = {
+    "standard": {"B": 20, "T": 10},
+    "none": {},
+    "bombs": {"B": 10},
+    "teleports": {"T": 5},
+    "lines": {"R": 15, "S": 15},
+}
+SYMBOLS = ("X", "O")
+ELO_START = 1500
+ELO_K = 32
+
+
+def legal_columns(board):
+    """
+    Returns:
+        columns (list): 1-based columns with an empty top cell.
+    """
+    return [column + 1 for column in range(board.columns) if board.grid[0][column] == " "]
+
+
+def random_policy(game, player, rng):
+    """
+    Plays a random piece from the hand in a random open column.
+    """
+    columns = legal_columns(game.board)
+    if columns == []:
+        return None
+    symbol = rng.choice(player.pieces).symbol
+    return symbol, rng.choice(columns)
+
+
+def center_policy(game, player, rng):
+    """
+    Plays the player's own pieces as close to the middle as possible.
+    """
+    columns = legal_columns(game.board)
+    if columns == []:
+        return None
+    middle = (game.board.columns + 1) / 2
+    best = min(abs(column - middle) for column in columns)
+    column = rng.choice([column for column in columns if abs(column - middle) == best])
+
+    symbols = [piece.symbol for piece in player.pieces]
+    symbol = player.symbol if player.symbol in symbols else rng.choice(symbols)
+    return symbol, column
+
+
+def try_insert(board, piece, column):
+    """
+    Inserts piece, undoing the move if it fails part way.
+    Returns:
+        bool: True if the piece was inserted.
+    """
+    saved = [row[:] for row in board.grid]
+    try:
+        return piece.insert(board, column)
+    except IndexError:
+        # A teleport near the edge of an even-sized board mirrors to a
+        # cell past the grid; treat it as a piece that did not fit
+        board.grid = saved
+        return False
+
+
+def _winner_after(game, piece, column):
+    # Plays piece on a copy of the grid and returns check_win's verdict
+    saved = [row[:] for row in game.board.grid]
+    try:
+        if try_insert(game.board, piece, column) == False:
+            return False
+        return game.check_win()
+    finally:
+        game.board.grid = saved
+
+
+def greedy_policy(game, player, rng):
+    """
+    Takes a winning move if one exists, otherwise blocks a column
+    where the opponent would win, otherwise plays like center_policy.
+    """
+    columns = legal_columns(game.board)
+    if columns == []:
+        return None
+
+    me = "Player 1" if player is game.player_1 else "Player 2"
+    opponent = game.player_2 if player is game.player_1 else game.player_1
+
+    # Try each distinct piece in the hand for an immediate win
+    pieces = {}
+    for piece in player.pieces:
+        pieces.setdefault(piece.symbol, piece)
+    for column in columns:
+        for symbol, piece in pieces.items():
+            if _winner_after(game, piece, column) == me:
+                return symbol, column
+
+    # Block with a regular piece where the opponent's piece would win
+    if player.symbol in pieces:
+        threat = Player(opponent.name, opponent.symbol)
+        threat.add_piece(opponent.symbol, 1)
+        for column in columns:
+            if _winner_after(game, threat.pieces[0], column) not in (False, me):
+                return player.symbol, column
+
+    return center_policy(game, player, rng)
+
+
+POLICIES = {
+    "random": random_policy,
+    "center": center_policy,
+    "greedy": greedy_policy,
+}
+
+
+def setup_game(rows, columns, inventory, names):
+    """
+    Builds a game without prompting, dealing pieces the way
+    Game.setup does plus the inventory's special pieces.
+    Returns:
+        game (Game): Ready to play, with player 1 to move.
+    """
+    game = Game(rows, columns)
+    cells = rows * columns
+
+    for name, symbol in zip(names, SYMBOLS):
+        game.players.append(Player(name, symbol))
+    game.player_1, game.player_2 = game.players
+
+    pieces_quantity = cells // 2
+    game.player_2.add_piece(SYMBOLS[1], pieces_quantity)
+    # Player 1 receives the extra piece on odd size boards
+    game.player_1.add_piece(SYMBOLS[0], pieces_quantity + cells % 2)
+
+    for symbol, cells_per_piece in INVENTORIES[inventory].items():
+        piece_class = EXAMPLE_PIECES.get(symbol) or PIECE_TYPES.get(symbol, Piece)
+        for player in game.players:
+            player.pieces.extend(piece_class(symbol) for i in range(cells // cells_per_piece))
+
+    game.current_player = game.player_1
+    return game
+
+
+def play_game(spec):
+    """
+    Plays one game to the end in a loop instead of Game.begin's
+    recursion, following the same rules for wins and draws.
+    Input:
+        spec (dict): Game id, policies, board size, inventory and seed.
+    Returns:
+        result (dict): spec plus the winner ("player_1", "player_2"
+        or None for a draw) and the number of moves.
+    """
+    rng = random.Random(spec["seed"])
+    names = (spec["player_1"], spec["player_2"])
+    game = setup_game(spec["rows"], spec["columns"], spec["inventory"], names)
+    policies = {player: POLICIES[name] for player, name in zip(game.players, names)}
+
+    winner = None
+    moves = 0
+    # Every move fills or clears a cell, so this bounds a runaway game
+    move_limit = 4 * spec["rows"] * spec["columns"]
+
+    while moves < move_limit:
+        if game.player_1.pieces == [] and game.player_2.pieces == []:
+            break
+
+        player = game.current_player
+        inserted = False
+        # As in begin(), a chosen piece leaves the hand even if it does not fit
+        while inserted == False and player.pieces != []:
+            choice = policies[player](game, player, rng)
+            if choice is None:
+                break
+            symbol, column = choice
+            for piece in player.pieces:
+                if piece.symbol == symbol:
+                    player.pieces.remove(piece)
+                    inserted = try_insert(game.board, piece, column)
+                    break
+        moves += 1
+
+        verdict = game.check_win()
+        if verdict == "Player 1":
+            winner = "player_1"
+            break
+        if verdict == "Player 2":
+            winner = "player_2"
+            break
+        if verdict == "Both":
+            break
+        if all(cell != " " for row in game.board.grid for cell in row):
+            break
+
+        game.change_player()
+
+    result = dict(spec)
+    result["winner"] = winner
+    result["moves"] = moves
+    return result
+
+
+def schedule(policies, sizes, inventories, games, seed=0):
+    """
+    Lists every game of the tournament in a fixed order.
+    Input:
+        policies (list): Policy names; each ordered pair plays.
+        sizes (list): (rows, columns) boards.
+        inventories (list): Inventory names.
+        games (int): Games per pairing, board and inventory.
+        seed (int): Base seed; game seeds derive from it.
+    Returns:
+        specs (list): One dict per game. The "game" id holds the base
+        seed and every per-game setting, and the game's seed is derived
+        from the id, so a game keeps its id and seed whatever else is
+        scheduled.
+    """
+    specs = []
+    for rows, columns in sizes:
+        for inventory in inventories:
+            for player_1 in policies:
+                for player_2 in policies:
+                    if player_1 == player_2:
+                        continue
+                    for number in range(games):
+                        game_id = f"{seed}/{rows}x{columns}/{inventory}/{player_1}-{player_2}/{number}"
+                        specs.append({
+                            "game": game_id,
+                            "player_1": player_1,
+                            "player_2": player_2,
+                            "rows": rows,
+                            "columns": columns,
+                            "inventory": inventory,
+                            "seed": zlib.crc32(game_id.encode("utf-8")),
+                        })
+    return specs
+
+
+class Elo:
+    def __init__(self, k=ELO_K, start=ELO_START):
+        """
+        Initializes an empty rating table.
+        Input:
+            k (int): Largest change from a single game.
+            start (int): Rating of a policy's first game.
+        """
+        self.k = k
+        self.start = start
+        self.ratings = {}
+        self.records = {}
+
+    def update(self, result):
+        """
+        Applies one game result to both players' ratings.
+        """
+        first = result["player_1"]
+        second = result["player_2"]
+        rating_1 = self.ratings.get(first, self.start)
+        rating_2 = self.ratings.get(second, self.start)
+
+        expected_1 = 1 / (1 + 10 ** ((rating_2 - rating_1) / 400))
+        if result["winner"] == "player_1":
+            score_1 = 1.0
+        elif result["winner"] == "player_2":
+            score_1 = 0.0
+        else:
+            score_1 = 0.5
+
+        self.ratings[first] = rating_1 + self.k * (score_1 - expected_1)
+        self.ratings[second] = rating_2 - self.k * (score_1 - expected_1)
+
+        for name, score in ((first, score_1), (second, 1 - score_1)):
+            record = self.records.setdefault(name, {"wins": 0, "losses": 0, "draws": 0})
+            if score == 1:
+                record["wins"] += 1
+            elif score == 0:
+                record["losses"] += 1
+            else:
+                record["draws"] += 1
+
+    def table(self):
+        """
+        Returns:
+            table (list): {"policy", "rating", wins, losses, draws} dicts,
+            highest rating first.
+        """
+        rows = []
+        for name, rating in sorted(self.ratings.items(), key=lambda item: -item[1]):
+            row = {"policy": name, "rating": round(rating, 1)}
+            row.update(self.records[name])
+            rows.append(row)
+        return rows
+
+
+def load_results(file_name):
+    """
+    Reads the results written so far.
+    Returns:
+        results (list): Finished games in the order they were written.
+        A torn last line from an interrupted run is ignored.
+    """
+    results = []
+    try:
+        with open(file_name, "r") as file_object:
+            for line in file_object:
+                if not line.endswith("\n"):
+                    break
+                results.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def save_ratings(elo, file_name, finished, total):
+    """
+    Writes the current ratings atomically.
+    """
+    temporary = file_name + ".tmp"
+    with open(temporary, "w") as file_object:
+        json.dump({"finished": finished, "total": total, "ratings": elo.table()}, file_object, indent=2)
+    os.replace(temporary, file_name)
+
+
+def run_tournament(specs, results_file, workers=None, ratings_file=None, checkpoint_every=100):
+    """
+    Plays every game in specs that results_file does not already hold.
+    Results in the file for games outside specs, such as those from a
+    run with another seed, are kept but left out of the ratings.
+    Input:
+        specs (list): Games from schedule().
+        results_file (str): JSON lines file of finished games.
+        workers (int): Worker processes, defaults to CPU count;
+        1 plays in this process.
+        ratings_file (str): If given, ratings are saved here every
+        checkpoint_every games and at the end.
+    Returns:
+        elo (Elo): Ratings over all finished games.
+    """
+    elo = Elo()
+    scheduled = {spec["game"] for spec in specs}
+    done = set()
+    for result in load_results(results_file):
+        if result["game"] in scheduled and result["game"] not in done:
+            elo.update(result)
+            done.add(result["game"])
+
+    # Drop a torn last line so new results start on a fresh line
+    if os.path.exists(results_file):
+        with open(results_file, "rb+") as file_object:
+            data = file_object.read()
+            file_object.truncate(data.rfind(b"\n") + 1)
+
+    pending = [spec for spec in specs if spec["game"] not in done]
+    finished = len(done)
+    total = finished + len(pending)
+
+    with open(results_file, "a") as output:
+        def record(result):
+            nonlocal finished
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            elo.update(result)
+            finished += 1
+            if ratings_file and finished % checkpoint_every == 0:
+                save_ratings(elo, ratings_file, finished, total)
+
+        if workers == 1:
+            for spec in pending:
+                record(play_game(spec))
+        else:
+            if workers is None:
+                workers = os.cpu_count() or 1
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                # Keep a bounded number of games in flight
+                queue = iter(pending)
+                running = set()
+                for spec in queue:
+                    running.add(executor.submit(play_game, spec))
+                    if len(running) >= 4 * workers:
+                        break
+                while running:
+                    completed, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        record(future.result())
+                        spec = next(queue, None)
+                        if spec is not None:
+                            running.add(executor.submit(play_game, spec))
+            finally:
+                # On an interrupt, drop queued games instead of playing
+                # them; the results file already holds every finished one
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    if ratings_file:
+        save_ratings(elo, ratings_file, finished, total)
+    return elo
+
+
+def parse_size(text):
+    rows, columns = text.lower().split("x")
+    return int(rows), int(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gravity game AI tournament")
+    parser.add_argument("results", help="JSON lines results file, resumed if it exists")
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--sizes", nargs="+", default=[(5, 5), (6, 7)], type=parse_size, help="ROWSxCOLUMNS")
+    parser.add_argument("--inventories", nargs="+", default=["standard", "none"], choices=list(INVENTORIES))
+    parser.add_argument("--games", type=int, default=10, help="games per pairing, board and inventory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--ratings", metavar="FILE", help="save ratings to FILE as games finish")
+    args = parser.parse_args()
+
+    specs = schedule(args.policies, args.sizes, args.inventories, args.games, args.seed)
+    elo = run_tournament(specs, args.results, args.workers, args.ratings)
+
+    print(f"{'policy':<10}{'rating':>8}{'wins':>8}{'losses':>8}{'draws':>8}")
+    for row in elo.table():
+        print(f"{row['policy']:<10}{row['rating']:>8}{row['wins']:>8}{row['losses']:>8}{row['draws']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Static checks for sentence grammars.
+
+Works on the dict from generate_structure or a compiled grammar from
+load_grammar. Finds undefined, unreachable and non-terminating
+symbols, recursive cycles, and the expected and maximum number of
+tokens each symbol expands to.
+"""
+import math
+
+# Expected lengths above this are treated as diverging
+LENGTH_LIMIT = 1e12
+
+
+def is_symbol(token):
+    """
+    Returns:
+        bool: True for tokens the generator expands, like <np>.
+    """
+    return "<" in token
+
+
+def split_alternatives(values):
+    """
+    Returns:
+        (alternatives, probabilities): Alternatives as token tuples and
+        the chance each one is drawn.
+    """
+    alternatives = [
+        tuple(choice.split(",")) if isinstance(choice, str) else tuple(choice)
+        for choice in values
+    ]
+    weights = getattr(values, "weights", None)
+    if weights is None:
+        weights = [1.0] * len(alternatives)
+    total = sum(weights)
+    return alternatives, [weight / total for weight in weights]
+
+
+class GrammarReport:
+    def __init__(self, structure, start=None):
+        """
+        Analyses a grammar.
+        Input:
+            structure (dict): Grammar to analyse.
+            start (str): Start symbol, defaults to the first rule.
+        """
+        self.rules = {}
+        for symbol, values in structure.items():
+            self.rules[symbol] = split_alternatives(values)
+
+        if start is None:
+            start = next(iter(self.rules), None)
+        self.start = start
+
+        self.undefined = set()
+        for alternatives, probabilities in self.rules.values():
+            for alternative in alternatives:
+                for token in alternative:
+                    if is_symbol(token) and token not in self.rules:
+                        self.undefined.add(token)
+
+        self.reachable = self._reachable()
+        self.unreachable = set(self.rules) - self.reachable
+        self.productive = self._productive()
+        self.non_terminating = set(self.rules) - self.productive
+        self.cycles = self._cycles()
+        self.expected_length = self._expected_length()
+        self.max_length = self._max_length()
+
+    def _symbols(self, alternative):
+        return [token for token in alternative if is_symbol(token)]
+
+    def _reachable(self):
+        if self.start is None:
+            return set()
+        seen = {self.start}
+        stack = [self.start]
+        while stack:
+            symbol = stack.pop()
+            if symbol not in self.rules:
+                continue
+            for alternative in self.rules[symbol][0]:
+                for token in self._symbols(alternative):
+                    if token not in seen:
+                        seen.add(token)
+                        stack.append(token)
+        return seen
+
+    def _productive(self):
+        # A symbol terminates if some alternative uses only terminals
+        # and symbols already known to terminate
+        productive = set()
+        changed = True
+        while changed:
+            changed = False
+            for symbol, (alternatives, probabilities) in self.rules.items():
+                if symbol in productive:
+                    continue
+                for alternative in alternatives:
+                    if all(token in productive for token in self._symbols(alternative)):
+                        productive.add(symbol)
+                        changed = True
+                        break
+        return productive
+
+    def _usable(self, symbol):
+        # Alternatives that can actually finish expanding
+        return [
+            alternative
+            for alternative in self.rules[symbol][0]
+            if all(token in self.productive for token in self._symbols(alternative))
+        ]
+
+    def _cycles(self):
+        """
+        Finds groups of mutually recursive symbols with Tarjan's
+        algorithm, run with an explicit stack.
+        """
+        index = {}
+        low = {}
+        on_stack = set()
+        stack = []
+        cycles = []
+        counter = 0
+
+        for root in self.rules:
+            if root in index:
+                continue
+            work = [(root, iter(self._edges(root)))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+
+            while work:
+                symbol, edges = work[-1]
+                advanced = False
+                for target in edges:
+                    if target not in index:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(self._edges(target))))
+                        advanced = True
+                        break
+                    if target in on_stack:
+                        low[symbol] = min(low[symbol], index[target])
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[symbol])
+
+                if low[symbol] == index[symbol]:
+                    group = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        group.append(member)
+                        if member == symbol:
+                            break
+                    if len(group) > 1 or symbol in self._edges(symbol):
+                        cycles.append(sorted(group))
+
+        return cycles
+
+    def _edges(self, symbol):
+        edges = []
+        for alternative in self.rules[symbol][0]:
+            for token in self._symbols(alternative):
+                if token in self.rules and token not in edges:
+                    edges.append(token)
+        return edges
+
+    def _expected_length(self):
+        """
+        Solves E[s] = sum over alternatives of p * (terminals + E[t])
+        by fixed-point iteration, which converges exactly when the
+        expected length is finite.
+        """
+        expected = {symbol: 0.0 for symbol in self.rules}
+        infinite = set(self.non_terminating)
+
+        changes = {}
+        for iteration in range(100000):
+            for symbol, (alternatives, probabilities) in self.rules.items():
+                if symbol in infinite:
+                    continue
+                total = 0.0
+                for alternative, probability in zip(alternatives, probabilities):
+                    if probability == 0:
+                        continue
+                    for token in alternative:
+                        if not is_symbol(token):
+                            total += probability
+                        elif token in infinite or token not in self.rules:
+                            total = math.inf
+                        else:
+                            total += probability * expected[token]
+                if total > LENGTH_LIMIT:
+                    infinite.add(symbol)
+                    continue
+                changes[symbol] = total - expected[symbol]
+                expected[symbol] = total
+
+            tolerance = 1e-15 * max([1.0] + [expected[symbol] for symbol in changes])
+            if all(changes[symbol] <= tolerance for symbol in changes if symbol not in infinite):
+                break
+        else:
+            # Still growing after every iteration: treat as diverging
+            tolerance = 1e-9 * max([1.0] + list(expected.values()))
+            infinite.update(symbol for symbol in changes if changes[symbol] > tolerance)
+
+        for symbol in infinite:
+            expected[symbol] = math.inf
+        return expected
+
+    def _max_length(self):
+        """
+        Longest sentence each symbol can produce, or None when a
+        reachable cycle makes it unbounded.
+        """
+        longest = {}
+        unbounded = set(self.non_terminating)
+        for group in self.cycles:
+            unbounded.update(member for member in group if member in self.productive)
+
+        # Symbols that can reach an unbounded one are unbounded too
+        changed = True
+        while changed:
+            changed = False
+            for symbol in self.productive:
+                if symbol in unbounded:
+                    continue
+                for alternative in self._usable(symbol):
+                    if any(token in unbounded for token in self._symbols(alternative)):
+                        unbounded.add(symbol)
+                        changed = True
+                        break
+
+        # What remains is acyclic: settle symbols once their parts are known
+        pending = [symbol for symbol in self.productive if symbol not in unbounded]
+        while pending:
+            remaining = []
+            for symbol in pending:
+                lengths = []
+                for alternative in self._usable(symbol):
+                    parts = self._symbols(alternative)
+                    if any(token not in longest for token in parts):
+                        break
+                    lengths.append(len(alternative) - len(parts) + sum(longest[token] for token in parts))
+                else:
+                    longest[symbol] = max(lengths)
+                    continue
+                remaining.append(symbol)
+            if len(remaining) == len(pending):
+                break
+            pending = remaining
+
+        for symbol in self.rules:
+            if symbol not in longest:
+                longest[symbol] = None
+        return longest
+
+    def problems(self):
+        """
+        Returns:
+            problems (list): Reasons the grammar cannot be expanded
+            safely from its start symbol, empty if it can.
+        """
+        problems = []
+        undefined = sorted(
+            token
+            for symbol in self.reachable
+            if symbol in self.rules
+            for alternative in self.rules[symbol][0]
+            for token in self._symbols(alternative)
+            if token in self.undefined
+        )
+        if self.start is not None and self.start not in self.rules:
+            problems.append(f"start symbol {self.start} is not defined")
+        if undefined:
+            problems.append("undefined symbols: " + ", ".join(sorted(set(undefined))))
+
+        stuck = sorted(self.non_terminating & self.reachable)
+        if stuck:
+            problems.append("symbols that never terminate: " + ", ".join(stuck))
+        elif self.start in self.rules and math.isinf(self.expected_length[self.start]):
+            problems.append(f"expected length of {self.start} is unbounded")
+        return problems
+
+    def summary(self):
+        """
+        Returns:
+            summary (dict): The report in a JSON-friendly form.
+        """
+        return {
+            "start": self.start,
+            "undefined": sorted(self.undefined),
+            "unreachable": sorted(self.unreachable),
+            "non_terminating": sorted(self.non_terminating),
+            "cycles": self.cycles,
+            "expected_length": self.expected_length,
+            "max_length": self.max_length,
+            "problems": self.problems(),
+        }
+
+
+def analyze_grammar(structure, start=None):
+    """
+    Returns:
+        report (GrammarReport): Analysis of the grammar.
+    """
+    return GrammarReport(structure, start)
+
+
+def check_grammar(structure, start=None):
+    """
+    Raises ValueError if the grammar cannot be expanded safely.
+    Returns:
+        report (GrammarReport): The analysis, when the grammar is safe.
+    """
+    report = GrammarReport(structure, start)
+    problems = report.problems()
+    if problems:
+        raise ValueError("Unusable grammar: " + "; ".join(problems))
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from generator import generate_structure
+
+    # Print the report for a grammar file, e.g. python analysis.py grammar.txt
+    report = analyze_grammar(generate_structure(sys.argv[1]))
+    print(json.dumps(report.summary(), indent=2, default=str))
@@ -0,0 +1,154 @@
+"""
+Bulk sentence generation across a process pool.
+
+Work is cut into fixed-size shards and every shard gets its own seed
+derived from the base seed and the shard number. Shards are emitted in
+order, so the same seed always gives the same sentences no matter how
+many workers run them.
+
+Usage:
+    python batch.py COUNT [--seed 0] [--workers 4] [--output out.txt.gz]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from generator import expand_sentence, load_grammar
+from stream import open_output
+
+DEFAULT_GRAMMAR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+def shard_seed(seed, shard):
+    """
+    Returns:
+        seed (int): Deterministic seed for one shard of a batch.
+    """
+    return seed * 1_000_003 + shard
+
+
+def generate_shard(grammar_path, symbol, seed, count):
+    """
+    Generates one shard of sentences.
+    Input:
+        grammar_path (str): Grammar file to expand.
+        symbol (str): Start symbol.
+        seed (int): Seed for this shard.
+        count (int): Number of sentences.
+    Returns:
+        sentences (list): Sentences with tokens joined by spaces.
+    """
+    grammar = load_grammar(grammar_path)
+    rng = random.Random(seed)
+    return [" ".join(expand_sentence(symbol, grammar, rng)) for i in range(count)]
+
+
+def iter_batch(count, seed=0, grammar_path=DEFAULT_GRAMMAR, workers=None, shard_size=1000, symbol="<s>"):
+    """
+    Lazily yields count sentences generated across worker processes.
+    Input:
+        count (int): Number of sentences to generate.
+        seed (int): Base seed, output depends only on this,
+        count, shard_size and the grammar.
+        grammar_path (str): Grammar file to expand.
+        workers (int): Worker processes, 1 runs in this process.
+        shard_size (int): Sentences per shard.
+        symbol (str): Start symbol.
+    Yields:
+        sentence (str): Each sentence, in order.
+    """
+    grammar_path = os.path.abspath(grammar_path)
+    shards = (
+        (shard_seed(seed, shard), min(shard_size, count - start))
+        for shard, start in enumerate(range(0, count, shard_size))
+    )
+
+    if workers == 1:
+        for seed_value, size in shards:
+            yield from generate_shard(grammar_path, symbol, seed_value, size)
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded window of shards in flight so memory stays
+        # flat however many sentences are requested
+        pending = deque()
+        remaining = shards
+
+        for seed_value, size in remaining:
+            pending.append(executor.submit(generate_shard, grammar_path, symbol, seed_value, size))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            sentences = pending.popleft().result()
+            next_shard = next(remaining, None)
+            if next_shard is not None:
+                seed_value, size = next_shard
+                pending.append(executor.submit(generate_shard, grammar_path, symbol, seed_value, size))
+            yield from sentences
+
+
+def write_batch(stream, count, seed=0, grammar_path=DEFAULT_GRAMMAR, workers=None, shard_size=1000, symbol="<s>"):
+    """
+    Streams a batch of sentences to a file, one per line.
+    Input:
+        stream (file): Open text file to write to.
+        Other arguments as for iter_batch.
+    Returns:
+        stats (dict): Sentences written, elapsed seconds and
+        sentences per second.
+    """
+    start = time.perf_counter()
+    written = 0
+    for sentence in iter_batch(count, seed, grammar_path, workers, shard_size, symbol):
+        stream.write(sentence + "\n")
+        written += 1
+    elapsed = time.perf_counter() - start
+
+    if elapsed > 0:
+        rate = written / elapsed
+    else:
+        rate = 0.0
+    return {"sentences": written, "seconds": elapsed, "sentences_per_sec": rate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate sentences in bulk")
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--grammar", default=DEFAULT_GRAMMAR)
+    parser.add_argument("--output", help="file to write (.gz to compress), defaults to stdout")
+    args = parser.parse_args()
+
+    if args.output:
+        # Paths ending in .gz are written compressed
+        stream = open_output(args.output)
+    else:
+        stream = sys.stdout
+
+    try:
+        stats = write_batch(
+            stream, args.count, args.seed, args.grammar, args.workers, args.shard_size
+        )
+    finally:
+        if args.output:
+            stream.close()
+
+    print(
+        f"{stats['sentences']} sentences in {stats['seconds']:.2f}s "
+        f"({stats['sentences_per_sec']:.0f} sentences/sec)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Benchmarks for the story generator.
+
+Every case runs with a fixed seed and stdout sent to a null sink. For
+each case the harness records the best and mean time over several
+repeats and the deepest Python call stack seen. Results can be saved
+as a JSON baseline and compared against later runs, so throughput and
+recursion-depth regressions are caught.
+
+Usage:
+    python benchmark.py [--repeat 5] [--save baseline.json]
+    python benchmark.py --compare baseline.json [--tolerance 0.25]
+    python benchmark.py --profile profiles/
+"""
+import argparse
+import builtins
+import contextlib
+import cProfile
+import json
+import os
+import random
+import sys
+import time
+
+import generator
+
+SEED = 1110
+SHAPE_SIZES = (1, 15, 101, 901)
+MIRROR_LENGTHS = (10, 900, 100000)
+STORY_LENGTHS = (10, 100, 1000)
+
+
+def _story_case(n):
+    def run():
+        # story() reads stairs and mirror answers from input()
+        original_input = builtins.input
+        builtins.input = lambda prompt="": "yes"
+        try:
+            generator.is_first_call = True
+            generator.story(n)
+        finally:
+            builtins.input = original_input
+    return run
+
+
+def _shape_case(function, size):
+    def run():
+        # Measure rendering, not the cache
+        generator.render_shape.cache_clear()
+        function(size)
+    return run
+
+
+def build_cases():
+    """
+    Returns:
+        cases (list): (name, function) pairs to benchmark.
+    """
+    grammar_path = generator.GRAMMAR_PATH
+    structure = generator.generate_structure(grammar_path)
+    cases = [
+        ("generate_structure", lambda: generator.generate_structure(grammar_path)),
+        ("generate_sentence", lambda: generator.generate_sentence("<s>", structure)),
+    ]
+
+    for name in ("stairs", "square", "diamond"):
+        for size in SHAPE_SIZES:
+            cases.append((f"{name}({size})", _shape_case(getattr(generator, name), size)))
+
+    for length in MIRROR_LENGTHS:
+        text = "dungeon " * (length // 8) + "x" * (length % 8)
+        cases.append((f"mirror({length})", lambda text=text: generator.mirror(text)))
+
+    for n in STORY_LENGTHS:
+        cases.append((f"story({n})", _story_case(n)))
+
+    return cases
+
+
+def measure_depth(function):
+    """
+    Runs function once and returns the deepest call stack it reached,
+    relative to the caller.
+    """
+    depth = 0
+    deepest = 0
+
+    def tracer(frame, event, arg):
+        nonlocal depth, deepest
+        if event == "call":
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        elif event == "return":
+            depth -= 1
+
+    sys.setprofile(tracer)
+    try:
+        function()
+    finally:
+        sys.setprofile(None)
+    return deepest
+
+
+def run_case(function, repeat, number):
+    """
+    Times function over repeat rounds of number calls each.
+    Returns:
+        result (dict): Best and mean seconds per call, and calls/sec.
+    """
+    timings = []
+    for round_number in range(repeat):
+        random.seed(SEED)
+        start = time.perf_counter()
+        for call in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+
+    best = min(timings)
+    return {
+        "best": best,
+        "mean": sum(timings) / len(timings),
+        "per_sec": 1 / best if best > 0 else 0.0,
+    }
+
+
+def calibrate(function, target=0.05):
+    """
+    Returns:
+        number (int): Calls needed for a round to take about target seconds.
+    """
+    number = 1
+    while True:
+        random.seed(SEED)
+        start = time.perf_counter()
+        for call in range(number):
+            function()
+        if time.perf_counter() - start >= target or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def run_suite(repeat=5, profile_dir=None, only=None):
+    """
+    Runs every benchmark case.
+    Input:
+        repeat (int): Timing rounds per case.
+        profile_dir (str): If given, write a cProfile file per case.
+        only (str): Run only cases whose name contains this text.
+    Returns:
+        results (dict): Maps case name to its measurements.
+    """
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    results = {}
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for name, function in build_cases():
+            if only and only not in name:
+                continue
+
+            random.seed(SEED)
+            try:
+                depth = measure_depth(function)
+            except RecursionError:
+                results[name] = {"error": "RecursionError"}
+                continue
+
+            number = calibrate(function)
+            result = run_case(function, repeat, number)
+            result["depth"] = depth
+            result["number"] = number
+            results[name] = result
+
+            if profile_dir:
+                random.seed(SEED)
+                profiler = cProfile.Profile()
+                profiler.runcall(function)
+                file_name = "".join(c if c.isalnum() else "_" for c in name) + ".prof"
+                profiler.dump_stats(os.path.join(profile_dir, file_name))
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compares results against a saved baseline.
+    Input:
+        results (dict): Output of run_suite.
+        baseline (dict): Previously saved results.
+        tolerance (float): Allowed slowdown, 0.25 means 25%.
+    Returns:
+        regressions (list): Descriptions of cases that got slower,
+        deeper or started failing.
+    """
+    regressions = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is None or "error" in old:
+            continue
+        if "error" in new:
+            regressions.append(f"{name}: now fails with {new['error']}")
+            continue
+        if new["best"] > old["best"] * (1 + tolerance):
+            change = (new["best"] / old["best"] - 1) * 100
+            regressions.append(f"{name}: {change:.0f}% slower")
+        if new["depth"] > old["depth"]:
+            regressions.append(f"{name}: stack depth {old['depth']} -> {new['depth']}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'case':<22}{'best (ms)':>12}{'mean (ms)':>12}{'calls/sec':>12}{'depth':>8}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<22}{result['error']:>44}")
+            continue
+        print(
+            f"{name:<22}{result['best'] * 1000:>12.4f}{result['mean'] * 1000:>12.4f}"
+            f"{result['per_sec']:>12.0f}{result['depth']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the story generator")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run only cases containing this text")
+    parser.add_argument("--save", metavar="FILE", help="save results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--profile", metavar="DIR", help="write cProfile output per case")
+    args = parser.parse_args()
+
+    results = run_suite(args.repeat, args.profile, args.only)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as file_object:
+            json.dump(results, file_object, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file_object:
+            baseline = json.load(file_object)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
 import random
 import os
+import sys
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+from analysis import GrammarReport, check_grammar
 
 is_first_call = True
 
+# Compiled grammars keyed by absolute path: path -> (mtime, grammar, report)
+grammar_cache = {}
+grammar_cache_stats = {"hits": 0, "misses": 0, "compile_time": 0.0}
+
 def story(n):
     """
     Simulates a dungeon adventure with various random encounters. 
@@ -13,57 +23,222 @@ def story(n):
         None
     """
     global is_first_call
-    if is_first_call == True:
-        print("You enter the dungeon...")
-        is_first_call = False
+    # Answers come from the keyboard; input() shows the prompts itself
+    engine = StoryEngine(random, input, echo_prompts=False, intro=is_first_call)
+    is_first_call = False
 
-    if n <= 0:  # Reject non-positive input
-        return
+    for text in engine.run(n):
+        sys.stdout.write(text)
 
-    else:
-        # Each item corresponds to a certain 'encounter' function call
+
+STAIRS_PROMPT = "You've found some descending stairs, would you like to go down? "
+MIRROR_PROMPT = "You've found the mirror realm! Anything you say will be reversed, try it out: "
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+class Prompt:
+    """
+    A question the story needs answered before it can continue.
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StoryEngine:
+    def __init__(self, rng=None, answers=None, grammar_path=GRAMMAR_PATH, echo_prompts=True, intro=True):
+        """
+        Initializes a self-contained dungeon story.
+        Input:
+            rng (random.Random): Source of randomness, a new
+            unseeded generator if not given.
+            answers: A function taking the prompt text and returning
+            the answer, an iterable of answers, or None to answer
+            every prompt with an empty string.
+            grammar_path (str): Grammar used by the stranger.
+            echo_prompts (bool): Include prompts and answers in the
+            output, like a terminal transcript.
+            intro (bool): Open with "You enter the dungeon...".
+        """
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+        self.echo_prompts = echo_prompts
+        self.intro = intro
+        self.grammar = load_grammar(grammar_path)
+
+        if answers is None or callable(answers):
+            self.answers = answers
+        else:
+            remaining = iter(answers)
+            self.answers = lambda prompt: next(remaining, "")
+
+    def steps(self, n):
+        """
+        Runs n encounters as a generator. Text is yielded as strings;
+        when a Prompt is yielded, the answer must be passed back
+        with send().
+        Input:
+            n (int): Number of encounters.
+        Yields:
+            str or Prompt: Story text, or a question to answer.
+        """
+        rng = self.rng
+        if self.intro:
+            yield "You enter the dungeon...\n"
+
+        # Each item corresponds to a certain encounter
         encounters = ["stairs", "treasure", "mirror", "stranger"]
-        encounter = random.choice(encounters)
-
-        if encounter == "stairs":
-            confirm_yes = input(
-                "You've found some descending stairs, would you like to go down? "
-            )
-            if confirm_yes.lower() == "yes" or confirm_yes.lower() == "y":
-                number_stairs = random.choice(list(range(1, 11)))
-                stairs(number_stairs)
+        # Sample probabilities (90% square, 10% diamond)
+        treasures = 9 * ["square"] + 1 * ["diamond"]
+
+        for turn in range(n):
+            encounter = rng.choice(encounters)
+
+            if encounter == "stairs":
+                confirm_yes = (yield Prompt(STAIRS_PROMPT)) or ""
+                if confirm_yes.lower() == "yes" or confirm_yes.lower() == "y":
+                    yield render_shape("stairs", rng.choice(range(1, 11)))
+                else:
+                    yield "You choose not to go down.\n"
+
+            elif encounter == "treasure":
+                if rng.choice(treasures) == "square":
+                    yield "You found a square gem!\n"
+                    yield render_shape("square", rng.choice(range(1, 6)))
+                else:
+                    yield "You found a rare diamond!\n"
+                    yield render_shape("diamond", rng.choice(range(1, 16)))
+
+            elif encounter == "mirror":
+                user_string = (yield Prompt(MIRROR_PROMPT)) or ""
+                yield user_string[::-1] + "\n"
+
+            elif encounter == "stranger":
+                yield "You come across a mysterious stranger, he warns you that...\n"
+                yield sentence_text("<s>", self.grammar, rng) + "\n"
+
+    def run(self, n):
+        """
+        Runs n encounters, answering prompts from the answer source.
+        Yields:
+            text (str): Story output in order.
+        """
+        steps = self.steps(n)
+        answer = None
+        while True:
+            try:
+                item = steps.send(answer)
+            except StopIteration:
+                return
+
+            answer = None
+            if isinstance(item, Prompt):
+                if self.answers is None:
+                    answer = ""
+                else:
+                    answer = self.answers(item.text)
+                if self.echo_prompts:
+                    yield item.text + answer + "\n"
             else:
-                print("You choose not to go down.")
-
-        elif encounter == "treasure":
-            # Sample probabilities (90% square, 10% diamond)
-            sample_set = 9 * ["square"] + 1 * ["diamond"]
-            drawn_treasure = random.choice(sample_set)
-
-            if drawn_treasure == "square":
-                print("You found a square gem!")
-                square_size = random.choice(list(range(1, 6)))
-                square(square_size)
-            if drawn_treasure == "diamond":
-                print("You found a rare diamond!")
-                diamond_size = random.choice(list(range(1, 16)))
-                diamond(diamond_size)
-
-        elif encounter == "mirror":
-            user_string = input(
-                "You've found the mirror realm! Anything you say will be reversed, try it out: "
-            )
-            mirror(user_string)
-
-        elif encounter == "stranger":
-            print("You come across a mysterious stranger, he warns you that...")
-            base_dir = os.path.dirname(__file__)
-            grammar_path = os.path.join(base_dir, "grammar.txt")
-            dictionary = generate_structure(grammar_path)
-            generate_sentence("<s>", dictionary)
-            print("")
-
-    return story(n - 1)
+                yield item
+
+    def render(self, n):
+        """
+        Returns:
+            text (str): The whole story for n encounters.
+        """
+        return "".join(self.run(n))
+
+
+def shape_lines(shape: str, size: int):
+    """
+    Builds a shape line by line without recursion.
+    Input:
+        shape (str): One of "stairs", "square" or "diamond".
+        size (int): Levels, side length or vertical length.
+    Yields:
+        line (str): Each line of the shape, top to bottom.
+    """
+    if shape == "stairs":
+        # Each level is one block wider than the one above
+        for level in range(1, size + 1):
+            yield level * "\u2585"
+
+    elif shape == "square":
+        if size <= 0:
+            return
+        yield size * "\u25c6"  # Top line of square
+        # Padding in middle of square
+        middle = "\u25c6" + (size - 2) * " " + "\u25c6"
+        for row in range(size - 2):
+            yield middle
+        if size > 1:
+            yield size * "\u25c6"  # Bottom line of square
+
+    elif shape == "diamond":
+        # Diamonds must be a positive odd vertical length
+        if size <= 0 or (size % 2) == 0:
+            return
+        # Number of whitespaces to the left of the
+        # axis of symmetry of diamond
+        middle_position = (size - 1) // 2
+        tip = middle_position * " " + "*" + middle_position * " "
+
+        yield tip
+        # Rows widen to the middle then narrow again
+        for row in range(1, size - 1):
+            state = min(row, size - 1 - row)
+            padding = ((2 * state) - 1) * " "
+            indent = (middle_position - state) * " "
+            yield indent + "*" + padding + "*" + indent
+        if size > 1:
+            yield tip
+
+    else:
+        raise ValueError(f"Unknown shape: {shape}")
+
+
+@lru_cache(maxsize=128)
+def render_shape(shape: str, size: int) -> str:
+    """
+    Returns a whole shape as one string, one line per row.
+    Repeated (shape, size) pairs are served from a cache.
+    """
+    return "".join(line + "\n" for line in shape_lines(shape, size))
+
+
+# Larger shapes are streamed instead of rendered and cached, since a
+# shape's text grows with the square of its size
+MAX_CACHED_SHAPE = 64
+
+
+def write_shape(shape: str, size: int, stream=None):
+    """
+    Writes a shape to a stream, in a single call for cached sizes
+    and in blocks of lines for larger ones.
+    Input:
+        shape (str): One of "stairs", "square" or "diamond".
+        size (int): Size of the shape.
+        stream (file): Where to write, defaults to sys.stdout.
+    """
+    if stream is None:
+        stream = sys.stdout
+    if size <= MAX_CACHED_SHAPE:
+        stream.write(render_shape(shape, size))
+        return
+
+    block = []
+    block_size = 0
+    for line in shape_lines(shape, size):
+        block.append(line + "\n")
+        block_size += len(line) + 1
+        if block_size >= 1 << 16:
+            stream.write("".join(block))
+            block = []
+            block_size = 0
+    stream.write("".join(block))
 
 
 def stairs(levels: int):
@@ -74,123 +249,185 @@ def stairs(levels: int):
     Returns:
         None
     """
-    if levels <= 0:  # Reject non-positive input
-        return
-    else:
-        # Base case: one level
-        if levels == 1:
-            print("\u2585")
-            return
-        else:
-            stairs(levels - 1)
-            print(levels * "\u2585")
+    write_shape("stairs", levels)
 
 
-def square(length: int, state=1):
+def square(length: int):
     """
     Prints out a square using the ◆ character.
     Input:
         length (int): the number of units on a side.
-        state (int): default parameter to track state (internal use).
     Returns:
         None
     """
-    if length <= 0:
-        return
-    else:
-        # Base case: iteration equals requested length
-        if state == length:
-            print(length * "\u25c6")  # Top line of square
-            return
-        else:
-            square(length, state + 1)
-
-            if state == 1:  # Bottom line of square
-                print(length * "\u25c6")
-            else:
-                # Padding in middle of square
-                print("\u25c6" + (length - 2) * " " + "\u25c6")
+    write_shape("square", length)
 
 
-def diamond(length, state=0):
+def diamond(length):
     """
     Prints out a diamond using the * character.
     Input:
         length (int): Must be a positive odd integer (vertical length).
-        state (int): Tracks recursion depth (internal use).
     Returns:
         None
     """
-    if length <= 0 or (length % 2) == 0:
-        return
-
-    else:
-        # Number of whitespaces to the left of the
-        # axis of symmetry of diamond
-        middle_position = (length - 1) // 2
+    write_shape("diamond", length)
 
-        # Base case: requested length reached (tip of diamond)
-        if state == length - 1:
-            print(middle_position * " " + "*" + middle_position * " ")
-            return
 
-        else:
-            diamond(length, state + 1)
-
-            if state == 0:  # Bottom point of diamond
-                print(middle_position * " " + "*" + middle_position * " ")
-
-            else:
-                # Top half of diamond
-                if state > middle_position:
-                    # Converting state to equivalent n for calculation
-                    state = (2 * middle_position) - state
+def mirror(string_input: str, stream=None):
+    """
+    Prints out the reverse of a string.
+    Input:
+        string_input (str): The string to be printed in reverse order.
+        stream (file): Where to write, defaults to sys.stdout.
+    Returns:
+        None
+    """
+    if stream is None:
+        stream = sys.stdout
 
-                # Calculate required whitespace inside indent
-                padding_value = (2 * state) - 1
-                padding = padding_value * " "
+    # Reverse in one slice and write it with the newline in one go
+    stream.write(string_input[::-1] + "\n")
 
-                # Calculate required whitespace outside indent
-                indent_value = (length - (padding_value + 2)) // 2
-                indent = indent_value * " "
 
-                print(indent + "*" + padding + "*" + indent)
+def mirror_chunks(chunks):
+    """
+    Reverses text arriving in pieces, such as lines from a socket.
+    The last character must be seen before the first can be output,
+    so the pieces are held, but never re-joined or copied.
+    Input:
+        chunks (iterable): Pieces of text in order.
+    Yields:
+        piece (str): Reversed pieces, last piece first.
+    """
+    pieces = list(chunks)
+    for piece in reversed(pieces):
+        yield piece[::-1]
 
 
-def mirror(string_input: str):
+def mirror_file(file_name: str, stream=None, chunk_size=1 << 16):
     """
-    Prints out the reverse of a string.
+    Prints out the reverse of a UTF-8 file, reading it backwards
+    in fixed-size blocks so memory use does not grow with the file.
     Input:
-        string_input (str): The string to be printed in reverse order.
+        file_name (str): File whose contents are reversed.
+        stream (file): Where to write, defaults to sys.stdout.
+        chunk_size (int): Bytes read at a time.
     Returns:
         None
     """
-    characters = list(string_input)
+    if stream is None:
+        stream = sys.stdout
+
+    with open(file_name, "rb") as file_object:
+        position = file_object.seek(0, os.SEEK_END)
+        # Bytes of a character split across two blocks
+        carried = b""
+
+        while position > 0:
+            start = max(0, position - chunk_size)
+            file_object.seek(start)
+            block = file_object.read(position - start) + carried
+            position = start
+
+            # UTF-8 continuation bytes look like 0b10xxxxxx; any at the
+            # front belong to a character that starts in the next block
+            split = 0
+            if position > 0:
+                while split < len(block) and (block[split] & 0xC0) == 0x80:
+                    split += 1
+            carried = block[:split]
+
+            stream.write(block[split:].decode("utf-8")[::-1])
+
+    stream.write("\n")
 
-    # Base case: if the list of characters is empty
-    # (all characters have been processed), print a newline and return
-    if characters == []:
-        print("")
-        return
-    else:
-        # Remove last character and print it without newline
-        print(characters.pop(-1), end="")
 
-        # Recursive call for the remaining characters
-        remaining_string = "".join(characters)
-        mirror(remaining_string)
+class WeightedChoices(tuple):
+    """
+    Production alternatives with per-alternative weights.
+    Walker alias tables are built once so each draw is O(1),
+    however many alternatives there are.
+    """
+    def __new__(cls, alternatives, weights):
+        return super().__new__(cls, alternatives)
+
+    def __init__(self, alternatives, weights):
+        """
+        Input:
+            alternatives (iterable): The alternatives to draw from.
+            weights (list): Non-negative weight for each alternative.
+        """
+        if len(weights) != len(self) or len(self) == 0:
+            raise ValueError("Each alternative needs exactly one weight")
+        if min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError("Weights must be non-negative and not all zero")
+
+        self.weights = tuple(weights)
+        count = len(self)
+        total = sum(weights)
+
+        # Scale weights so the average column holds probability 1
+        scaled = [weight * count / total for weight in weights]
+        self.probability = [1.0] * count
+        self.alias = list(range(count))
+
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+
+        # Pair each under-full column with an over-full one
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def sample(self, rng=random):
+        """
+        Returns:
+            alternative: One alternative drawn by weight.
+        """
+        # One uniform draw picks the column and the coin flip
+        position = rng.random() * len(self)
+        column = int(position)
+        if position - column < self.probability[column]:
+            return self[column]
+        return self[self.alias[column]]
+
+
+def parse_weight(choice: str):
+    """
+    Splits an optional "*weight" suffix off an alternative,
+    e.g. "playful*3" has weight 3.
+    Returns:
+        (alternative, weight): weight is None when not given.
+    """
+    if "*" in choice:
+        alternative, weight = choice.rsplit("*", 1)
+        try:
+            return alternative, float(weight)
+        except ValueError:
+            pass
+    return choice, None
 
 
 def generate_structure(file_name: str) -> dict:
     """
     Reads the sentence structure from a file and
-    represents it in a dict.
+    represents it in a dict. Alternatives may end in
+    "*weight" to be drawn proportionally to that weight.
     Input:
         file_name (str): File from which dictionary
         format will be extracted.
     Returns:
         structure (dict): Dictionary representing
-        sentence structure from file.
+        sentence structure from file. Weighted symbols map
+        to WeightedChoices instead of a list.
     """
     structure = {}
     file_object = open(file_name, "r")
@@ -204,6 +441,13 @@ def generate_structure(file_name: str) -> dict:
         # The second part is the value, separated by '|'
         value = splitted[1].split("|")
 
+        # Weighted alternatives are stripped of their suffix and
+        # drawn through alias tables built here, once per load
+        parsed = [parse_weight(choice) for choice in value]
+        if any(weight is not None for choice, weight in parsed):
+            weights = [1.0 if weight is None else weight for choice, weight in parsed]
+            value = WeightedChoices([choice for choice, weight in parsed], weights)
+
         # Assign the key-value pair to the structure dictionary
         structure[key] = value
 
@@ -211,30 +455,165 @@ def generate_structure(file_name: str) -> dict:
     return structure
 
 
-def generate_sentence(symbol, structure):
+def compile_structure(structure: dict) -> MappingProxyType:
+    """
+    Compiles a sentence structure into an immutable grammar where
+    every alternative is pre-split into a tuple of tokens.
+    Input:
+        structure (dict): Output of generate_structure.
+    Returns:
+        grammar (MappingProxyType): Read-only mapping of symbol
+        to a tuple of token tuples.
+    """
+    compiled = {}
+    for key, values in structure.items():
+        alternatives = tuple(tuple(choice.split(",")) for choice in values)
+        if isinstance(values, WeightedChoices):
+            alternatives = WeightedChoices(alternatives, values.weights)
+        compiled[key] = alternatives
+    return MappingProxyType(compiled)
+
+
+def load_grammar(file_name: str) -> MappingProxyType:
+    """
+    Returns the compiled grammar for a file, reading and compiling
+    it only when the file is new or has been modified. Grammars are
+    checked as they are compiled, with the first rule as the start.
+    Input:
+        file_name (str): File containing the sentence structure.
+    Returns:
+        grammar (MappingProxyType): Compiled grammar.
+    Raises:
+        ValueError: If the grammar uses undefined symbols, has
+        symbols that never terminate, or an unbounded expected length.
+    """
+    path = os.path.abspath(file_name)
+    mtime = os.stat(path).st_mtime_ns
+
+    cached = grammar_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        grammar_cache_stats["hits"] += 1
+        return cached[1]
+
+    # Cache miss: compile the grammar and remember when it was read
+    start = time.perf_counter()
+    grammar = compile_structure(generate_structure(path))
+    # Refuse unusable grammars here rather than part way through a run
+    report = check_grammar(grammar)
+    grammar_cache_stats["compile_time"] += time.perf_counter() - start
+    grammar_cache_stats["misses"] += 1
+
+    grammar_cache[path] = (mtime, grammar, report)
+    return grammar
+
+
+def grammar_report(file_name: str) -> GrammarReport:
+    """
+    Returns:
+        report (GrammarReport): Reachability, termination and
+        expected and maximum expansion lengths for a grammar file.
+    """
+    load_grammar(file_name)
+    return grammar_cache[os.path.abspath(file_name)][2]
+
+
+def grammar_cache_info() -> dict:
+    """
+    Returns:
+        info (dict): Cache hits, misses, cached grammars and
+        total seconds spent compiling.
+    """
+    info = dict(grammar_cache_stats)
+    info["grammars"] = len(grammar_cache)
+    return info
+
+
+def expand_sentence(symbol, structure, rng=random, max_depth=None, max_tokens=None):
+    """
+    Expands a symbol into terminal tokens using an explicit stack,
+    so deep or recursive grammars never hit the recursion limit.
+    Input:
+        symbol (str): The symbol to expand.
+        structure (dict): A dictionary presenting sentence
+        structure, or a grammar from load_grammar.
+        rng (random.Random): Source of randomness, defaults
+        to the random module.
+        max_depth (int): Optional limit on nested expansions.
+        max_tokens (int): Optional limit on tokens produced.
+    Yields:
+        token (str): Each terminal, in sentence order.
+    Raises:
+        ValueError: If a limit is exceeded.
+    """
+    # Each stack entry is a symbol and the depth it was found at;
+    # the root symbol is always expanded, as in the recursive version
+    stack = [(symbol, 0)]
+    produced = 0
+
+    while stack:
+        part, depth = stack.pop()
+
+        if depth > 0 and "<" not in part:  # When terminal reached
+            if max_tokens is not None and produced >= max_tokens:
+                raise ValueError(f"Sentence longer than {max_tokens} tokens")
+            produced += 1
+            yield part
+            continue
+
+        if max_depth is not None and depth >= max_depth:
+            raise ValueError(f"Sentence deeper than {max_depth} expansions")
+
+        # Randomly pick one item from symbol values
+        values = structure.get(part)
+        if isinstance(values, WeightedChoices):
+            choice = values.sample(rng)
+        else:
+            choice = rng.choice(values)
+        # Compiled grammars hold alternatives already split into tokens
+        if isinstance(choice, str):
+            choice = choice.split(",")
+
+        # Push in reverse so the leftmost token is expanded first
+        for token in reversed(choice):
+            stack.append((token, depth + 1))
+
+        # Every pending symbol yields at least one token, so stop
+        # early rather than growing the stack without bound
+        if max_tokens is not None and produced + len(stack) > max_tokens:
+            raise ValueError(f"Sentence longer than {max_tokens} tokens")
+
+
+def sentence_text(symbol, structure, rng=random, max_depth=None, max_tokens=None):
+    """
+    Returns a random sentence as a string, each token
+    followed by a space as generate_sentence prints it.
+    """
+    tokens = list(expand_sentence(symbol, structure, rng, max_depth, max_tokens))
+    if tokens == []:
+        return ""
+    return " ".join(tokens) + " "
+
+
+def generate_sentence(symbol, structure, rng=random, stream=None, max_depth=None, max_tokens=None):
     """
     Prints a random sentence from a provided
     dictionary structure.
     Input:
         symbol (str): The symbol to look at in the structure.
         structure (dict): A dictionary presenting
-        sentence strucutre.
+        sentence strucutre, or a grammar from load_grammar.
+        rng (random.Random): Source of randomness.
+        stream (file): Where to write, defaults to sys.stdout.
+        max_depth (int): Optional limit on nested expansions.
+        max_tokens (int): Optional limit on tokens produced.
     Returns:
         None
     """
-    # Retrieve corresponding values from symbol
-    values = structure.get(symbol)
-    # Randomly pick one item from symbol values
-    choice = random.choice(values)
-    splitted = choice.split(",")
+    if stream is None:
+        stream = sys.stdout
 
-    for part in splitted:
-        if "<" not in part:  # When non-terminal reached
-            print(part, end=" ")
-            continue  # Move to adjacent symbol
-        else:
-            # Break down terminals further
-            generate_sentence(part, structure)
+    # Build the whole sentence first, then write it in one go
+    stream.write(sentence_text(symbol, structure, rng, max_depth, max_tokens))
 
 if __name__ == "__main__":
     # Change this to the number of levels you want
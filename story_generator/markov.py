@@ -0,0 +1,298 @@
+"""
+N-gram Markov sentence generator trained on grammar output.
+
+A corpus of sentences from a grammar is turned into word transition
+counts. The table is stored compactly in flat arrays: one sorted key
+per context, an offset into the transition arrays for each context,
+and for every transition the next word and its running count. Models
+can be saved to disk and memory-mapped back, so large tables are
+shared between processes and load instantly.
+
+Usage:
+    python markov.py train model.bin [--sentences 100000] [--order 2]
+    python markov.py sample model.bin [--count 10] [--seed 0] [--mmap]
+"""
+import argparse
+import json
+import mmap
+import random
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from batch import DEFAULT_GRAMMAR, iter_batch
+
+MAGIC = b"MKV1"
+# Reserved word ids marking the start and end of a sentence
+START = 0
+END = 1
+
+
+class MarkovModel:
+    def __init__(self, order, words, keys, offsets, next_words, cumulative, source=None):
+        """
+        Initializes a model from its tables.
+        Input:
+            order (int): Number of previous words used as context.
+            words (list): Vocabulary, indexed by word id.
+            keys: Sorted context keys, one per context.
+            offsets: Start of each context's transitions, plus an end marker.
+            next_words: Word id of each transition.
+            cumulative: Running count of each transition within its context.
+            source: Open file and mmap backing the tables, if any.
+        """
+        self.order = order
+        self.words = words
+        self.keys = keys
+        self.offsets = offsets
+        self.next_words = next_words
+        self.cumulative = cumulative
+        self.source = source
+
+    def context_key(self, context):
+        """
+        Packs a tuple of word ids into a single integer key.
+        """
+        key = 0
+        size = len(self.words)
+        for word in context:
+            key = key * size + word
+        return key
+
+    def next_word(self, context, rng=random):
+        """
+        Draws the word that follows a context.
+        Input:
+            context (tuple): The last order word ids.
+            rng (random.Random): Source of randomness.
+        Returns:
+            word (int): Id of the next word.
+        """
+        key = self.context_key(context)
+        state = bisect_left(self.keys, key)
+        if state == len(self.keys) or self.keys[state] != key:
+            return END
+
+        start = self.offsets[state]
+        stop = self.offsets[state + 1]
+        draw = rng.randrange(self.cumulative[stop - 1])
+        # Counts are cumulative, so a binary search picks the transition
+        position = bisect_right(self.cumulative, draw, start, stop - 1)
+        return self.next_words[position]
+
+    def sentence(self, rng=random, max_words=50):
+        """
+        Returns:
+            sentence (str): One sampled sentence of at most max_words.
+        """
+        context = (START,) * self.order
+        words = []
+        for i in range(max_words):
+            word = self.next_word(context, rng)
+            if word == END:
+                break
+            words.append(self.words[word])
+            context = context[1:] + (word,)
+        return " ".join(words)
+
+    def iter_sentences(self, count=None, rng=None, max_words=50):
+        """
+        Lazily yields sentences.
+        Input:
+            count (int): Sentences to yield, None for no limit.
+            rng (random.Random): Source of randomness.
+            max_words (int): Longest sentence allowed.
+        Yields:
+            sentence (str): Each sampled sentence.
+        """
+        if rng is None:
+            rng = random.Random()
+        produced = 0
+        while count is None or produced < count:
+            yield self.sentence(rng, max_words)
+            produced += 1
+
+    def save(self, file_name):
+        """
+        Writes the model in a layout that load_model can memory-map.
+        """
+        header = json.dumps(
+            {
+                "order": self.order,
+                "words": self.words,
+                "contexts": len(self.keys),
+                "transitions": len(self.next_words),
+            }
+        ).encode("utf-8")
+        # Pad so the arrays that follow start 8-byte aligned
+        header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+        with open(file_name, "wb") as file_object:
+            file_object.write(MAGIC)
+            file_object.write(len(header).to_bytes(8, "little"))
+            file_object.write(header)
+            for table, code in (
+                (self.keys, "Q"),
+                (self.offsets, "Q"),
+                (self.next_words, "I"),
+                (self.cumulative, "Q"),
+            ):
+                file_object.write(array(code, table).tobytes())
+
+    def close(self):
+        """
+        Releases the memory map, if the model was loaded with one.
+        """
+        if self.source is not None:
+            file_object, mapped = self.source
+            self.keys = self.offsets = self.next_words = self.cumulative = None
+            mapped.close()
+            file_object.close()
+            self.source = None
+
+
+def train(sentences, order=2):
+    """
+    Builds a model from an iterable of sentences.
+    Input:
+        sentences (iterable): Sentences with words separated by spaces.
+        order (int): Number of previous words used as context.
+    Returns:
+        model (MarkovModel): The trained model.
+    """
+    words = ["<start>", "<end>"]
+    ids = {}
+    counts = {}
+
+    for sentence in sentences:
+        context = (START,) * order
+        for word in sentence.split() + [None]:
+            if word is None:
+                word_id = END
+            else:
+                word_id = ids.get(word)
+                if word_id is None:
+                    word_id = len(words)
+                    ids[word] = word_id
+                    words.append(word)
+
+            following = counts.setdefault(context, {})
+            following[word_id] = following.get(word_id, 0) + 1
+            context = context[1:] + (word_id,)
+
+    # Contexts are packed into 64-bit keys
+    if len(words) ** order >= 1 << 64:
+        raise ValueError("Vocabulary too large for this order")
+
+    model = MarkovModel(order, words, None, None, None, None)
+    keys = array("Q")
+    offsets = array("Q")
+    next_words = array("I")
+    cumulative = array("Q")
+
+    for key, context in sorted((model.context_key(context), context) for context in counts):
+        keys.append(key)
+        offsets.append(len(next_words))
+        running = 0
+        for word_id, count in sorted(counts[context].items()):
+            running += count
+            next_words.append(word_id)
+            cumulative.append(running)
+    offsets.append(len(next_words))
+
+    model.keys = keys
+    model.offsets = offsets
+    model.next_words = next_words
+    model.cumulative = cumulative
+    return model
+
+
+def train_from_grammar(grammar_path=DEFAULT_GRAMMAR, sentences=100000, order=2, seed=0, workers=None):
+    """
+    Trains a model on sentences generated from a grammar file.
+    Returns:
+        model (MarkovModel): The trained model.
+    """
+    return train(iter_batch(sentences, seed, grammar_path, workers), order)
+
+
+def load_model(file_name, use_mmap=False):
+    """
+    Reads a model saved with MarkovModel.save.
+    Input:
+        file_name (str): Saved model.
+        use_mmap (bool): Map the tables from disk instead of
+        copying them into memory.
+    Returns:
+        model (MarkovModel): The loaded model.
+    """
+    file_object = open(file_name, "rb")
+    if file_object.read(4) != MAGIC:
+        file_object.close()
+        raise ValueError(f"{file_name} is not a Markov model")
+
+    header_size = int.from_bytes(file_object.read(8), "little")
+    header = json.loads(file_object.read(header_size))
+    contexts = header["contexts"]
+    transitions = header["transitions"]
+
+    sizes = (
+        ("Q", contexts),
+        ("Q", contexts + 1),
+        ("I", transitions),
+        ("Q", transitions),
+    )
+    position = len(MAGIC) + 8 + header_size
+
+    if use_mmap:
+        mapped = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        tables = []
+        for code, length in sizes:
+            width = array(code).itemsize
+            tables.append(view[position:position + width * length].cast(code))
+            position += width * length
+        source = (file_object, mapped)
+    else:
+        tables = []
+        for code, length in sizes:
+            table = array(code)
+            table.fromfile(file_object, length)
+            tables.append(table)
+        file_object.close()
+        source = None
+
+    return MarkovModel(header["order"], header["words"], *tables, source=source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markov sentence generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train on grammar output")
+    train_parser.add_argument("model")
+    train_parser.add_argument("--grammar", default=DEFAULT_GRAMMAR)
+    train_parser.add_argument("--sentences", type=int, default=100000)
+    train_parser.add_argument("--order", type=int, default=2)
+    train_parser.add_argument("--seed", type=int, default=0)
+
+    sample_parser = commands.add_parser("sample", help="sample sentences")
+    sample_parser.add_argument("model")
+    sample_parser.add_argument("--count", type=int, default=10)
+    sample_parser.add_argument("--seed", type=int, default=None)
+    sample_parser.add_argument("--mmap", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        model = train_from_grammar(args.grammar, args.sentences, args.order, args.seed)
+        model.save(args.model)
+        print(f"{len(model.keys)} contexts, {len(model.next_words)} transitions", file=sys.stderr)
+    else:
+        model = load_model(args.model, args.mmap)
+        for sentence in model.iter_sentences(args.count, random.Random(args.seed)):
+            print(sentence)
+        model.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Asyncio server running one dungeon story per connection.
+
+Every client gets its own StoryEngine with a private RNG. Story text is
+streamed as it is produced, and the stairs and mirror prompts are
+answered with a line read from the client.
+
+Run the server:
+    python server.py --port 8765 --encounters 10
+Measure it with the bundled load generator:
+    python server.py --load 2000 --port 8765
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from generator import Prompt, StoryEngine
+
+
+async def run_session(reader, writer, encounters, seed=None):
+    """
+    Plays one story over a connection.
+    Input:
+        reader (StreamReader): Client input, one answer per line.
+        writer (StreamWriter): Client output.
+        encounters (int): Number of encounters in the story.
+        seed (int): Optional seed for a reproducible story.
+    """
+    engine = StoryEngine(random.Random(seed))
+    steps = engine.steps(encounters)
+    answer = None
+
+    try:
+        while True:
+            try:
+                item = steps.send(answer)
+            except StopIteration:
+                break
+
+            answer = None
+            if isinstance(item, Prompt):
+                writer.write(item.text.encode("utf-8"))
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    # Client hung up mid-story
+                    break
+                answer = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            else:
+                writer.write(item.encode("utf-8"))
+                # Only wait when the client is slow to read
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host="127.0.0.1", port=8765, encounters=10):
+    """
+    Serves stories until cancelled.
+    """
+    async def handle(reader, writer):
+        await run_session(reader, writer, encounters)
+
+    server = await asyncio.start_server(handle, host, port, backlog=4096)
+    async with server:
+        await server.serve_forever()
+
+
+STAIRS_TEXT = b"descending stairs"
+
+
+async def play(host, port, answers=(b"yes\n", b"hello dungeon\n")):
+    """
+    Plays one story as a scripted client.
+    Returns:
+        received (int): Bytes of story received.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    received = 0
+    # Recent output, so a prompt split across reads is still recognised
+    tail = b""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            received += len(data)
+            tail = (tail + data)[-200:]
+            # Prompts end with "? " or ": " and no newline
+            if tail.endswith(b"? ") or tail.endswith(b": "):
+                if STAIRS_TEXT in tail:
+                    writer.write(answers[0])
+                else:
+                    writer.write(answers[1])
+                await writer.drain()
+    finally:
+        writer.close()
+    return received
+
+
+async def load_test(host="127.0.0.1", port=8765, sessions=1000, concurrency=1000):
+    """
+    Runs many scripted clients at once against a server.
+    Input:
+        sessions (int): Total stories to play.
+        concurrency (int): Stories in flight at a time.
+    Returns:
+        stats (dict): Sessions, bytes, seconds and sessions per second.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with limit:
+            return await play(host, port)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(limited() for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sessions": sessions,
+        "bytes": sum(results),
+        "seconds": elapsed,
+        "sessions_per_sec": sessions / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dungeon story server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--encounters", type=int, default=10)
+    parser.add_argument("--load", type=int, metavar="SESSIONS", help="run the load generator")
+    parser.add_argument("--concurrency", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.load:
+        stats = asyncio.run(load_test(args.host, args.port, args.load, args.concurrency))
+        print(
+            f"{stats['sessions']} sessions, {stats['bytes']} bytes in "
+            f"{stats['seconds']:.2f}s ({stats['sessions_per_sec']:.0f} sessions/sec)"
+        )
+        return
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.encounters))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Streaming output for very large story, shape and sentence runs.
+
+Every source here is a lazy generator of text chunks built on the
+generator module's iterative code (StoryEngine.run, shape_lines and
+expand_sentence), so nothing recurses and memory stays flat however
+long the run. write_chunks gathers the small chunks into large blocks
+before writing. Paths ending in .gz are compressed with gzip on the way
+out.
+
+Usage:
+    python stream.py story 1000000 --output story.txt.gz [--seed 0] [--answer yes]
+    python stream.py shape diamond 10001 --output diamond.txt
+    python stream.py sentences 1000000 --output sentences.txt.gz [--workers 4]
+"""
+import argparse
+import gzip
+import random
+import sys
+import time
+
+from generator import GRAMMAR_PATH, StoryEngine, shape_lines
+
+BLOCK_SIZE = 1 << 16
+
+
+def story_chunks(n, seed=None, answer="yes", echo_prompts=True, grammar_path=GRAMMAR_PATH):
+    """
+    Streams a story of n encounters.
+    Input:
+        n (int): Number of encounters.
+        seed (int): Seed for the story, None for a random one.
+        answer (str): Reply given to every prompt.
+        echo_prompts (bool): Include prompts and answers, like a
+        terminal transcript.
+        grammar_path (str): Grammar used by the stranger.
+    Yields:
+        text (str): Story output in order.
+    """
+    engine = StoryEngine(random.Random(seed), lambda prompt: answer, grammar_path, echo_prompts)
+    yield from engine.run(n)
+
+
+def shape_chunks(shape, size):
+    """
+    Streams a shape one line at a time, without the render cache.
+    Yields:
+        line (str): Each line of the shape, with its newline.
+    """
+    for line in shape_lines(shape, size):
+        yield line + "\n"
+
+
+def sentence_chunks(count, seed=None, grammar_path=GRAMMAR_PATH, workers=1, symbol="<s>"):
+    """
+    Streams count sentences, one per line.
+    Input:
+        count (int): Number of sentences.
+        seed (int): Seed for the run, None for a random one.
+        grammar_path (str): Grammar to expand.
+        workers (int): Worker processes. Sentences always come from
+        batch.iter_batch, so a seed gives the same output for any
+        number of workers.
+        symbol (str): Start symbol.
+    Yields:
+        sentence (str): Each sentence, with its newline.
+    """
+    # Imported here because batch imports open_output from this module
+    from batch import iter_batch
+
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    for sentence in iter_batch(count, seed, grammar_path, workers, symbol=symbol):
+        yield sentence + "\n"
+
+
+def open_output(path, compresslevel=6):
+    """
+    Opens a text file for writing, gzip-compressed if path ends in .gz.
+    Input:
+        path (str): File to write, or "-" for stdout.
+        compresslevel (int): gzip level from 1 (fastest) to 9.
+    Returns:
+        stream (file): The open file; closing stdout is left to the caller.
+    """
+    if path == "-":
+        return sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel)
+    return open(path, "w", encoding="utf-8")
+
+
+def write_chunks(chunks, stream, block_size=BLOCK_SIZE):
+    """
+    Writes chunks to a stream in blocks of about block_size characters.
+    Input:
+        chunks (iterable): Text to write, in order.
+        stream (file): Open text file.
+        block_size (int): Characters gathered before each write.
+    Returns:
+        written (int): Characters written.
+    """
+    block = []
+    pending = 0
+    written = 0
+    for chunk in chunks:
+        block.append(chunk)
+        pending += len(chunk)
+        if pending >= block_size:
+            stream.write("".join(block))
+            written += pending
+            block = []
+            pending = 0
+    stream.write("".join(block))
+    return written + pending
+
+
+def main():
+    # Output options follow the subcommand, so every subcommand shares them
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output", "-o", default="-", help="file to write, .gz to compress, - for stdout")
+    output.add_argument("--level", type=int, default=6, help="gzip compression level")
+
+    parser = argparse.ArgumentParser(description="Stream large story generator runs to a file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    story_parser = commands.add_parser("story", parents=[output], help="a story of N encounters")
+    story_parser.add_argument("encounters", type=int)
+    story_parser.add_argument("--seed", type=int, default=None)
+    story_parser.add_argument("--answer", default="yes", help="reply to every prompt")
+    story_parser.add_argument("--no-prompts", action="store_true", help="leave prompts out of the output")
+
+    shape_parser = commands.add_parser("shape", parents=[output], help="one shape of any size")
+    shape_parser.add_argument("shape", choices=("stairs", "square", "diamond"))
+    shape_parser.add_argument("size", type=int)
+
+    sentence_parser = commands.add_parser("sentences", parents=[output], help="N sentences, one per line")
+    sentence_parser.add_argument("count", type=int)
+    sentence_parser.add_argument("--seed", type=int, default=None)
+    sentence_parser.add_argument("--workers", type=int, default=1)
+    sentence_parser.add_argument("--grammar", default=GRAMMAR_PATH)
+    args = parser.parse_args()
+
+    if args.command == "story":
+        chunks = story_chunks(args.encounters, args.seed, args.answer, not args.no_prompts)
+    elif args.command == "shape":
+        chunks = shape_chunks(args.shape, args.size)
+    else:
+        chunks = sentence_chunks(args.count, args.seed, args.grammar, args.workers)
+
+    start = time.perf_counter()
+    stream = open_output(args.output, args.level)
+    try:
+        written = write_chunks(chunks, stream)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{written} characters in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()